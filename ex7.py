@@ -1,7 +1,61 @@
+import argparse
+import cProfile
 import csv
+import json
+import mmap
+import os
+import shlex
+import struct
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from heapq import merge, nlargest
+from multiprocessing import shared_memory
 
 # Global BST root
 owner_root = None
+# Keep the owner BST height-balanced (AVL). Changes the tree shape, so it's opt-in.
+BALANCED_OWNER_TREE = False
+# Lower-cased owner name -> BST node, kept in sync by insert/delete.
+# Set to None to fall back to searching the tree.
+owner_index = {}
+# Leaderboard of (pokedex size, lower-cased name), kept sorted by insert/delete
+# and by the pokedex operations. Set to None to sort on demand instead.
+owner_ranking = []
+# Never change a node that's in the tree: every change builds a new owner_root that
+# shares everything it didn't touch with the old one (see "Copy-on-write owner tree").
+COPY_ON_WRITE_TREE = False
+# The thread that publishes owner_roots (see publish_owner_root): with COPY_ON_WRITE_TREE
+# it's the only one that reads the indexes below, which it may be half-way through updating
+owner_writer = threading.get_ident()
+# Pokemon ID -> set of lower-cased names of the owners that have it, kept in sync by
+# insert/delete and the pokedex operations. Set to None to scan the pokedexes instead.
+species_owners = {}
+# The open on-disk store (see open_owner_store), or None when nothing is persisted
+owner_store = None
+# Rewrite the snapshot once the operation log has this many entries
+SNAPSHOT_EVERY = 1000
+# Pokedexes with more entries than this also keep a bitmap of their IDs, for O(1)
+# membership tests; smaller ones scan their ID array, which is just as quick at that size
+POKEDEX_BITMAP_MIN = 64
+# Output sinks write in chunks of this many lines
+OUTPUT_CHUNK_LINES = 4096
+# Reports over fewer owners than this run in-process; shipping the export would cost more
+PARALLEL_MIN_OWNERS = 50000
+# The worker processes of the parallel reports, started by the first one (see report_workers)
+report_pool = None
+report_pool_workers = 0
+report_pool_lock = threading.Lock()
+# Call counters and timings while instrumentation is on (see enable_metrics), else None
+metrics = None
+# Callbacks told about every pokedex change (see watch_pokedex)
+pokedex_listeners = []
 MAIN_MENU = """
 === Main Menu ===
 1. New Pokedex
@@ -43,39 +97,264 @@ PRINT_OWNERS_MENU = '''1) BFS
 ########################
 
 
-def read_hoenn_csv(filename):
+HOENN_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hoenn_pokedex.csv")
+HOENN_HEADER = ["ID", "Name", "Type", "HP", "Attack", "Can Evolve"]
+# Binary copy of a species CSV, written next to it (see write_species_cache)
+SPECIES_CACHE_SUFFIX = ".cache"
+SPECIES_CACHE_MAGIC = b"HOENN1"
+SPECIES_CACHE_HEADER = struct.Struct("<6sqqII")  # magic, csv mtime_ns, csv size, rows, names length
+SPECIES_CACHE_ROW = struct.Struct("<IHHB")  # ID, HP, Attack, Can Evolve
+
+
+def iter_hoenn_csv(filename, errors=None):
     """
-    Reads 'hoenn_pokedex.csv' and returns a list of dicts:
-      [ { "ID": int, "Name": str, "Type": str, "HP": int,
-          "Attack": int, "Can Evolve": "TRUE"/"FALSE" },
-        ... ]
+    Read a species CSV (like 'hoenn_pokedex.csv') one row at a time and yield a dict per row:
+      { "ID": int, "Name": str, "Type": str, "HP": int,
+        "Attack": int, "Can Evolve": "TRUE"/"FALSE" }
+    Blank rows are skipped. An invalid row raises ValueError naming its line,
+    unless an `errors` list is given: then (line number, message) is appended
+    to it and the row is skipped.
     """
-    data_list = []
-    with open(filename, mode='r', encoding='utf-8') as f:
+    seen_ids = set()
+    with open(filename, mode='r', encoding='utf-8', newline='') as f:
         reader = csv.reader(f, delimiter=',')  # Use comma as the delimiter
-        first_row = True
         for row in reader:
             # It's the header row (like ID,Name,Type,HP,Attack,Can Evolve), skip it
-            if first_row:
-                first_row = False
+            if reader.line_num == 1 and row and row[0].strip() == HOENN_HEADER[0]:
+                continue
+            if not row or not any(cell.strip() for cell in row):
                 continue
 
             # row => [ID, Name, Type, HP, Attack, Can Evolve]
-            if not row or not row[0].strip():
-                break  # Empty or invalid row => stop
-            d = {
-                "ID": int(row[0]),
-                "Name": str(row[1]),
-                "Type": str(row[2]),
-                "HP": int(row[3]),
-                "Attack": int(row[4]),
-                "Can Evolve": str(row[5]).upper()
-            }
-            data_list.append(d)
-    return data_list
+            try:
+                if len(row) != len(HOENN_HEADER):
+                    raise ValueError(f"expected {len(HOENN_HEADER)} columns, got {len(row)}")
+                d = {
+                    "ID": int(row[0]),
+                    "Name": row[1].strip(),
+                    "Type": row[2].strip(),
+                    "HP": int(row[3]),
+                    "Attack": int(row[4]),
+                    "Can Evolve": row[5].strip().upper()
+                }
+                if not d["Name"] or not d["Type"]:
+                    raise ValueError("empty Name or Type")
+                if d["Can Evolve"] not in ("TRUE", "FALSE"):
+                    raise ValueError(f"Can Evolve must be TRUE or FALSE, got {row[5]!r}")
+                if d["ID"] in seen_ids:
+                    raise ValueError(f"duplicate ID {d['ID']}")
+            except ValueError as e:
+                if errors is None:
+                    raise ValueError(f"{filename}, line {reader.line_num}: {e}") from None
+                errors.append((reader.line_num, str(e)))
+                continue
+            seen_ids.add(d["ID"])
+            yield d
+
+
+def read_hoenn_csv(filename):
+    """
+    Reads 'hoenn_pokedex.csv' and returns a list of dicts:
+      [ { "ID": int, "Name": str, "Type": str, "HP": int,
+          "Attack": int, "Can Evolve": "TRUE"/"FALSE" },
+        ... ]
+    """
+    return list(iter_hoenn_csv(filename))
+
+
+def write_species_cache(filename, data_list):
+    """
+    Save data_list as the binary cache of the CSV `filename`, stamped with the
+    CSV's mtime and size. Failing to write it (e.g. read-only folder) is ignored.
+    """
+    stat = os.stat(filename)
+    names = "\n".join(f"{pokemon['Name']}\t{pokemon['Type']}" for pokemon in data_list).encode('utf-8')
+    cache_path = filename + SPECIES_CACHE_SUFFIX
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, mode='wb') as f:
+            f.write(SPECIES_CACHE_HEADER.pack(SPECIES_CACHE_MAGIC, stat.st_mtime_ns, stat.st_size,
+                                              len(data_list), len(names)))
+            for pokemon in data_list:
+                f.write(SPECIES_CACHE_ROW.pack(pokemon['ID'], pokemon['HP'], pokemon['Attack'],
+                                               pokemon['Can Evolve'] == 'TRUE'))
+            f.write(names)
+        os.replace(temp_path, cache_path)
+    except (OSError, struct.error):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def read_species_cache(filename):
+    """
+    Return the species list from the binary cache of the CSV `filename`, or None
+    if there's no cache or the CSV changed since it was written.
+    """
+    cache_path = filename + SPECIES_CACHE_SUFFIX
+    try:
+        stat = os.stat(filename)
+        with open(cache_path, mode='rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, mtime_ns, size, count, names_length = SPECIES_CACHE_HEADER.unpack_from(buffer, 0)
+            if magic != SPECIES_CACHE_MAGIC or mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+                return None
+            rows_start = SPECIES_CACHE_HEADER.size
+            names_start = rows_start + count * SPECIES_CACHE_ROW.size
+            names = buffer[names_start:names_start + names_length].decode('utf-8').split("\n")
+            rows = SPECIES_CACHE_ROW.iter_unpack(buffer[rows_start:names_start])
+            data_list = []
+            for (poke_id, hp, attack, can_evolve), name_and_type in zip(rows, names):
+                name, poke_type = name_and_type.split("\t")
+                data_list.append({"ID": poke_id, "Name": name, "Type": poke_type, "HP": hp,
+                                  "Attack": attack, "Can Evolve": "TRUE" if can_evolve else "FALSE"})
+            return data_list
+    except (OSError, ValueError, struct.error):
+        # Missing, empty or broken cache => just read the CSV again
+        return None
 
 
-HOENN_DATA = read_hoenn_csv("hoenn_pokedex.csv")
+def build_hoenn_indexes(data_list):
+    """
+    Build the lookup tables over the species list:
+      by_id:      ID -> Pokemon dict
+      by_name:    lower-cased name -> Pokemon dict
+      by_type:    lower-cased type -> [Pokemon dicts]
+      evolutions: ID -> ID it evolves into (only for species that can evolve)
+    The CSV lists each evolution line in order, so a species that can evolve
+    evolves into the next row of the file.
+    """
+    by_id = {}
+    by_name = {}
+    by_type = {}
+    evolutions = {}
+    for index, pokemon in enumerate(data_list):
+        by_id[pokemon['ID']] = pokemon
+        by_name[pokemon['Name'].lower()] = pokemon
+        by_type.setdefault(pokemon['Type'].lower(), []).append(pokemon)
+        if pokemon['Can Evolve'] == 'TRUE' and index + 1 < len(data_list):
+            evolutions[pokemon['ID']] = data_list[index + 1]['ID']
+    return by_id, by_name, by_type, evolutions
+
+
+def build_species_columns(data_list):
+    """
+    Build a columnar copy of the species list, one entry per row of the CSV:
+      'ID':                 array('I') column
+      'HP', 'Attack':       array('H') columns
+      'Can Evolve':         bytearray, 1 = can evolve
+      'Type':               array('B') of codes into 'type names'
+      'Name', 'name lower': lists of (interned) names
+      'type codes':         lower-cased type -> code
+      'row':                ID -> row number
+      'by id':              'Type', 'Can Evolve', 'HP' and 'Attack' again, as bytes
+                            indexed by ID (None for a stat with values over 255),
+                            so a filter criterion is one bytes.translate() (see species_mask)
+    Owners' pokedexes are arrays of IDs, so filters can look them up here and
+    compare plain ints instead of going through the per-species dicts.
+    """
+    columns = {
+        'ID': array('I'), 'HP': array('H'), 'Attack': array('H'),
+        'Can Evolve': bytearray(), 'Type': array('B'),
+        'Name': [], 'name lower': [],
+        'type names': [], 'type codes': {}, 'row': {},
+    }
+    type_codes = columns['type codes']
+    for row, pokemon in enumerate(data_list):
+        type_lower = pokemon['Type'].lower()
+        if type_lower not in type_codes:
+            type_codes[type_lower] = len(columns['type names'])
+            columns['type names'].append(sys.intern(pokemon['Type']))
+        columns['ID'].append(pokemon['ID'])
+        columns['HP'].append(pokemon['HP'])
+        columns['Attack'].append(pokemon['Attack'])
+        columns['Can Evolve'].append(pokemon['Can Evolve'] == 'TRUE')
+        columns['Type'].append(type_codes[type_lower])
+        columns['Name'].append(sys.intern(pokemon['Name']))
+        columns['name lower'].append(sys.intern(pokemon['Name'].lower()))
+        columns['row'][pokemon['ID']] = row
+
+    size = max(columns['ID'], default=0) + 1
+    columns['by id'] = {}
+    for column, missing in (('Type', 255), ('Can Evolve', 0), ('HP', 0), ('Attack', 0)):
+        values = columns[column]
+        if max(values, default=0) > 255:
+            columns['by id'][column] = None
+            continue
+        by_id = bytearray([missing]) * size
+        for poke_id, value in zip(columns['ID'], values):
+            by_id[poke_id] = value
+        columns['by id'][column] = bytes(by_id)
+    return columns
+
+
+def build_name_index(data_list):
+    """
+    Return (sorted lower-cased names, their IDs in the same order), for prefix
+    searches with bisect.
+    """
+    pairs = sorted((pokemon['Name'].lower(), pokemon['ID']) for pokemon in data_list)
+    return [pair[0] for pair in pairs], [pair[1] for pair in pairs]
+
+
+def load_species(data_list):
+    """
+    Replace the species data (and every table built from it) with data_list,
+    e.g. to run on a bigger dex than Hoenn.
+    """
+    global species_tables
+    by_id, by_name, by_type, evolutions = build_hoenn_indexes(data_list)
+    species_tables = {
+        'data': data_list,
+        'by id': by_id,
+        'by name': by_name,
+        'by type': by_type,
+        'evolutions': evolutions,
+        'columns': build_species_columns(data_list),
+        'name index': build_name_index(data_list),
+        'display lines': {pokemon['ID']: format_pokemon(pokemon) for pokemon in data_list},
+        # Owners' pokedexes are arrays of IDs: 2 bytes each, unless a bigger dex needs 4
+        'pokedex typecode': 'H' if max(by_id, default=0) < 1 << 16 else 'I',
+    }
+
+
+def species():
+    """
+    Return the species tables, loading HOENN_CSV the first time they're needed
+    (from its binary cache when that's up to date):
+      'data': HOENN_DATA, 'by id', 'by name', 'by type', 'evolutions',
+      'columns': see build_species_columns, 'name index': see build_name_index,
+      'display lines': ID -> format_pokemon() of that species,
+      'pokedex typecode': the array typecode of owners' pokedexes
+    """
+    if species_tables is None:
+        data_list = read_species_cache(HOENN_CSV)
+        if data_list is None:
+            data_list = read_hoenn_csv(HOENN_CSV)
+            write_species_cache(HOENN_CSV, data_list)
+        load_species(data_list)
+    return species_tables
+
+
+# Filled in by species() on first use, so importing this module doesn't read the CSV
+species_tables = None
+# Old module-level names -> their species table
+SPECIES_TABLE_NAMES = {
+    'HOENN_DATA': 'data',
+    'HOENN_BY_ID': 'by id',
+    'HOENN_BY_NAME': 'by name',
+    'HOENN_BY_TYPE': 'by type',
+    'HOENN_EVOLUTIONS': 'evolutions',
+    'HOENN_COLUMNS': 'columns',
+    'HOENN_NAME_INDEX': 'name index',
+}
+
+
+def __getattr__(name):
+    """
+    Keep ex7.HOENN_DATA (and the other tables) working, loading them on first access.
+    """
+    if name in SPECIES_TABLE_NAMES:
+        return species()[SPECIES_TABLE_NAMES[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 ########################
@@ -93,23 +372,150 @@ def get_poke_dict_by_id(poke_id):
     """
     Return a copy of the Pokemon dict from HOENN_DATA by ID, or None if not found.
     """
-    pass
+    pokemon = species()['by id'].get(poke_id)
+    if pokemon is None:
+        return None
+    return dict(pokemon)
 
 
 def get_poke_dict_by_name(name):
     """
     Return a copy of the Pokemon dict from HOENN_DATA by name, or None if not found.
+    The name is case-insensitive.
     """
-    pass
+    pokemon = species()['by name'].get(name.lower())
+    if pokemon is None:
+        return None
+    return dict(pokemon)
+
+
+def species_ids_with_prefix(prefix):
+    """
+    Return the IDs of all species whose name starts with prefix (case-insensitive),
+    in alphabetical order. O(log n + matches).
+    """
+    names, ids = species()['name index']
+    prefix = prefix.lower()
+    start = bisect_left(names, prefix)
+    # Every name with this prefix sorts before prefix + the highest code point
+    end = bisect_right(names, prefix + chr(sys.maxunicode), start)
+    return ids[start:end]
+
+
+def species_with_prefix(prefix):
+    """
+    Return the species dicts whose name starts with prefix, in alphabetical order.
+    """
+    return [species()['by id'][poke_id] for poke_id in species_ids_with_prefix(prefix)]
+
+
+def pokedex_with_prefix(owner_node, prefix):
+    """
+    Return the Pokemon dicts in this owner's pokedex whose name starts with prefix,
+    in alphabetical order.
+    """
+    by_id = species()['by id']
+    return [by_id[poke_id] for poke_id in species_ids_with_prefix(prefix) if pokedex_has(owner_node, poke_id)]
+
+
+def autocomplete_pokemon_name(prefix, limit=10, owner_node=None):
+    """
+    Return up to `limit` Pokemon names starting with prefix, alphabetically.
+    With owner_node, only names in that owner's pokedex are suggested.
+    Cheap enough to call on every keystroke.
+    """
+    suggestions = []
+    tables = species()
+    names, ids = tables['name index']
+    prefix = prefix.lower()
+    index = bisect_left(names, prefix)
+    while index < len(names) and len(suggestions) < limit and names[index].startswith(prefix):
+        poke_id = ids[index]
+        if owner_node is None or pokedex_has(owner_node, poke_id):
+            suggestions.append(tables['by id'][poke_id]['Name'])
+        index += 1
+    return suggestions
+
+
+def format_pokemon(pokemon):
+    """
+    Return the one-line description of a Pokemon dict used by every display.
+    """
+    return (f"ID: {pokemon['ID']}, Name: {pokemon['Name']}, Type: {pokemon['Type']},"
+            f" HP: {pokemon['HP']}, Attack: {pokemon['Attack']}, Can Evolve: {pokemon['Can Evolve']}")
+
+
+def make_output_sink(target='stdout', chunk_lines=OUTPUT_CHUNK_LINES):
+    """
+    Return an output sink: a buffer of ready-made lines, written to `target` in chunks
+    of about chunk_lines lines instead of one print() per line.
+    target is 'stdout', 'null' (drop everything, e.g. to time the work without the
+    terminal), a file path (opened for writing) or an open text stream.
+    """
+    sink = {'stream': None, 'null': target == 'null', 'close': False,
+            'lines': [], 'chunk lines': chunk_lines}
+    if target not in ('stdout', 'null'):
+        if isinstance(target, str):
+            sink['stream'] = open(target, mode='w', encoding='utf-8')
+            sink['close'] = True
+        else:
+            sink['stream'] = target
+    return sink
+
+
+def sink_write(sink, line):
+    """
+    Add one line to the sink.
+    """
+    sink['lines'].append(line)
+    if len(sink['lines']) >= sink['chunk lines']:
+        flush_output_sink(sink)
+
+
+def sink_extend(sink, lines):
+    """
+    Add many lines to the sink.
+    """
+    sink['lines'].extend(lines)
+    if len(sink['lines']) >= sink['chunk lines']:
+        flush_output_sink(sink)
 
 
-def display_pokemon_list(poke_list):
+def flush_output_sink(sink):
+    """
+    Write out everything buffered in the sink with a single write().
+    """
+    lines = sink['lines']
+    if lines and not sink['null']:
+        # Looked up every time so redirecting sys.stdout still works
+        stream = sink['stream'] if sink['stream'] is not None else sys.stdout
+        lines.append('')
+        stream.write('\n'.join(lines))
+        stream.flush()
+    lines.clear()
+
+
+def close_output_sink(sink):
+    """
+    Flush the sink, and close its file if the sink opened it.
+    """
+    flush_output_sink(sink)
+    if sink['close']:
+        sink['stream'].close()
+
+
+def display_pokemon_list(poke_list, sink=None):
     """
     Display a list of Pokemon dicts, or a message if empty.
+    Writes to sink if given, otherwise prints right away.
     """
-    for pokemon in poke_list:
-        print(f"ID: {pokemon['ID']}, Name: {pokemon['Name']}, Type: {pokemon['Type']},"
-              f" HP: {pokemon['HP']}, Attack: {pokemon['Attack']}, Can Evolve: {pokemon['Can Evolve']}")
+    lines = species()['display lines']
+    if sink is None:
+        sink = make_output_sink()
+        sink_extend(sink, [lines[pokemon['ID']] for pokemon in poke_list])
+        flush_output_sink(sink)
+    else:
+        sink_extend(sink, [lines[pokemon['ID']] for pokemon in poke_list])
 
 
 ########################
@@ -119,23 +525,109 @@ def display_pokemon_list(poke_list):
 def create_owner_node(owner_name, first_pokemon=None):
     """
     Create and return a BST node dict with keys: 'owner', 'pokedex', 'left', 'right'.
+    'pokedex' is an array of the caught Pokemon IDs in the order they were caught
+    (2 bytes each, see species()); names and stats come from the species tables.
+    'pokedex_bits' is a bitmap of the same IDs once the pokedex outgrows
+    POKEDEX_BITMAP_MIN, None until then.
+    'height' is the height of the node's subtree (see node_height).
+    Without first_pokemon (an ID) the pokedex starts empty.
+    """
+    tables = species()
+    node = {'name': owner_name,
+            'pokedex': array(tables['pokedex typecode']),
+            'pokedex_bits': None,
+            'left': None, 'right': None, 'height': 1}
+    if first_pokemon is not None:
+        node['pokedex'].append(tables['by id'][first_pokemon]['ID'])
+    return node
+
+
+def node_height(node):
+    """
+    Return the height of a subtree (0 for an empty one).
+    """
+    if node is None:
+        return 0
+    return node['height']
+
+
+def update_height(node):
+    node['height'] = 1 + max(node_height(node['left']), node_height(node['right']))
+
+
+def update_path_heights(path):
+    """
+    update_height() the nodes of `path` (root first), bottom-up, after the subtree
+    below its last node changed; stops at the first one whose height stays the same.
+    """
+    for node in reversed(path):
+        height = node['height']
+        update_height(node)
+        if node['height'] == height:
+            break
+
+
+def rotate_left(node):
+    """
+    Rotate a subtree left and return its new root.
+    """
+    new_root = node['right']
+    node['right'] = new_root['left']
+    new_root['left'] = node
+    update_height(node)
+    update_height(new_root)
+    return new_root
+
+
+def rotate_right(node):
+    """
+    Rotate a subtree right and return its new root.
+    """
+    new_root = node['left']
+    node['left'] = new_root['right']
+    new_root['right'] = node
+    update_height(node)
+    update_height(new_root)
+    return new_root
+
+
+def rebalance(node):
+    """
+    Restore the AVL property at this node (children are already balanced).
+    Return the new root of the subtree.
     """
-    index = first_pokemon - 1
-    return {'name': owner_name,
-            'pokedex': [HOENN_DATA[index]],
-            'left': None, 'right': None}
+    update_height(node)
+    balance = node_height(node['left']) - node_height(node['right'])
+    if balance > 1:
+        if node_height(node['left']['left']) < node_height(node['left']['right']):
+            node['left'] = rotate_left(node['left'])
+        return rotate_right(node)
+    if balance < -1:
+        if node_height(node['right']['right']) < node_height(node['right']['left']):
+            node['right'] = rotate_right(node['right'])
+        return rotate_left(node)
+    return node
 
 
 def insert_owner_bst(root, new_node):
     """
     Insert a new BST node by owner_name (alphabetically). Return updated root.
+    When BALANCED_OWNER_TREE is on, the path back to the root is rebalanced (AVL),
+    so sorted input doesn't degrade the tree into a linked list.
     """
+    if COPY_ON_WRITE_TREE:
+        return cow_insert_owner(root, new_node)
     if root is None:
+        index_owner(new_node)
+        new_node['height'] = 1
         return new_node
     name = new_node['name']
     name = name.lower()
     current_root = root
+    # Nodes we went through, so we can rebalance on the way back up
+    path = []
     while current_root is not None:
+        path.append(current_root)
         current_name = current_root['name']
         current_name = current_name.lower()
         if name == current_name:
@@ -153,73 +645,249 @@ def insert_owner_bst(root, new_node):
                 break
             # Else
             current_root = current_root['right']
-    return root
+
+    index_owner(new_node)
+    new_node['height'] = 1
+    if not BALANCED_OWNER_TREE:
+        # An insert only makes subtrees taller: raise the heights on the path while they grow
+        height = 1
+        for node in reversed(path):
+            height += 1
+            if node['height'] >= height:
+                break
+            node['height'] = height
+        return root
+    subtree = None
+    for node in reversed(path):
+        if subtree is not None:
+            # Re-attach the (possibly rotated) child subtree
+            if subtree['name'].lower() < node['name'].lower():
+                node['left'] = subtree
+            else:
+                node['right'] = subtree
+        subtree = rebalance(node)
+    return subtree
 
 
 def find_owner_bst(root, owner_name):
     """
     Locate a BST node by owner_name. Return that node or None if missing.
-    owner_name has to be .lower()
+    Walks down a single path using the (case-insensitive) ordering.
     """
-    if root is None:
-        return None
-    if root['name'].lower() == owner_name:
-        return root
-
-    attempt_left = find_owner_bst(root['left'], owner_name)
-    if attempt_left:
-        return attempt_left
-    attempt_right = find_owner_bst(root['right'], owner_name)
-    if attempt_right:
-        return attempt_right
+    owner_name = owner_name.lower()
+    current_root = root
+    while current_root is not None:
+        current_name = current_root['name'].lower()
+        if owner_name == current_name:
+            return current_root
+        if owner_name < current_name:
+            current_root = current_root['left']
+        else:
+            current_root = current_root['right']
     return None
 
 
-def min_node(node):
+def index_owner(node):
+    """
+    Add a node to the indexes that are enabled: owner_index, owner_ranking and,
+    for each Pokemon in its pokedex, species_owners.
+    """
+    if owner_index is not None:
+        owner_index[node['name'].lower()] = node
+    if owner_ranking is not None:
+        insort(owner_ranking, (len(node['pokedex']), node['name'].lower()))
+    for poke_id in node['pokedex']:
+        add_species_owner(node, poke_id)
+
+
+def unindex_owner(node):
     """
-    Return the leftmost node in a BST subtree.
+    Remove a node from the indexes that are enabled: species_owners for each
+    Pokemon in its pokedex, owner_ranking and owner_index.
     """
+    for poke_id in node['pokedex']:
+        drop_species_owner(node, poke_id)
+    unrank_owner(node, len(node['pokedex']))
+    if owner_index is not None:
+        owner_index.pop(node['name'].lower(), None)
+
+
+def owner_indexed(owner_node):
+    """
+    Return True if owner_node is the node owner_index has under its name, i.e. it's
+    in the tree (or owner_index is off, so there's no telling). The pokedex operations
+    only update the other indexes for such nodes: a node that isn't inserted yet, or
+    was deleted, mustn't show up in them.
+    """
+    return owner_index is None or owner_index.get(owner_node['name'].lower()) is owner_node
+
+
+def add_species_owner(owner_node, poke_id):
+    """
+    Record in species_owners that the owner has the Pokemon poke_id.
+    """
+    if species_owners is not None and owner_indexed(owner_node):
+        species_owners.setdefault(poke_id, set()).add(owner_node['name'].lower())
+
+
+def drop_species_owner(owner_node, poke_id):
+    """
+    Record in species_owners that the owner no longer has the Pokemon poke_id.
+    """
+    if species_owners is None or not owner_indexed(owner_node):
+        return
+    owner_keys = species_owners.get(poke_id)
+    if owner_keys is not None:
+        owner_keys.discard(owner_node['name'].lower())
+        if not owner_keys:
+            del species_owners[poke_id]
+
+
+def reset_owner_index(enabled=True):
+    """
+    Start a fresh owner_index, owner_ranking and species_owners, e.g. when building
+    a new tree from scratch. Pass enabled=False to turn them off.
+    """
+    global owner_index, owner_ranking, species_owners
+    owner_index = {} if enabled else None
+    owner_ranking = [] if enabled else None
+    species_owners = {} if enabled else None
+
+
+def indexes_cover(root):
+    """
+    Return True if owner_index, owner_ranking and species_owners describe the tree at
+    root, so a query on it can read them instead of walking the tree. They follow
+    the live tree, whose root is the node owner_index has under its name; a snapshot
+    (see snapshot_owner_tree) has a root of its own. With COPY_ON_WRITE_TREE they're
+    also only read on the writer's thread, as the writer may be changing them.
+    """
+    if root is None or owner_index is None or owner_index.get(root['name'].lower()) is not root:
+        return False
+    return not COPY_ON_WRITE_TREE or threading.get_ident() == owner_writer
+
+
+def find_owner(root, owner_name):
+    """
+    Locate an owner of the tree by name (case-insensitive).
+    Uses owner_index when it covers root (O(1)), otherwise searches the BST.
+    """
+    if indexes_cover(root):
+        return owner_index.get(owner_name.lower())
+    return find_owner_bst(root, owner_name)
+
+
+def relink_path(path, key, subtree):
+    """
+    Hang subtree back under the nodes of `path` (root first, as walked down to `key`)
+    and return the root. With BALANCED_OWNER_TREE each node on the way up is
+    rebalanced; otherwise only the last one changes (and the heights above it).
+    """
+    for node in reversed(path):
+        if key < node['name'].lower():
+            node['left'] = subtree
+        else:
+            node['right'] = subtree
+        if not BALANCED_OWNER_TREE:
+            update_path_heights(path)
+            return path[0]
+        subtree = rebalance(node)
+    return subtree
+
+
+def detach_min(node):
+    """
+    Remove the leftmost node from a subtree.
+    Return (new subtree root, the detached node).
+    """
+    path = []
     while node['left'] is not None:
+        path.append(node)
         node = node['left']
-    return node
+    return relink_path(path, node['name'].lower(), node['right']), node
 
 
 def delete_owner_bst(root, owner_name):
-    if not root:
-        return root
+    """
+    Remove the node of owner_name (case-insensitive) from the BST. Return updated root.
+    Walks down with an explicit path like insert_owner_bst, so a degenerate tree
+    can't hit the recursion limit.
+    """
+    if COPY_ON_WRITE_TREE:
+        return cow_delete_owner(root, owner_name)
 
     # Find the node to remove
-    if owner_name < root['name']:
-        root['left'] = delete_owner_bst(root['left'], owner_name)
-    elif owner_name > root['name']:
-        root['right'] = delete_owner_bst(root['right'], owner_name)
+    key = owner_name.lower()
+    path = []
+    node = root
+    while node is not None and node['name'].lower() != key:
+        path.append(node)
+        node = node['left'] if key < node['name'].lower() else node['right']
+    if node is None:
+        return root
+
+    unindex_owner(node)
+    # No child or one child: the child (or nothing) takes its place
+    if node['left'] is None:
+        subtree = node['right']
+    elif node['right'] is None:
+        subtree = node['left']
     else:
-        # Node to be removed found
-        # Case 1: Node with no children (leaf node)
-        if not root['left'] and not root['right']:
-            return None
-
-        # Case 2: Node with one child
-        if not root['left']:
-            return root['right']
-        elif not root['right']:
-            return root['left']
-
-        # Case 3: Node with two children
-        # Find the in-order successor (smallest value in the right subtree)
-        successor = min_node(root['right'])
-        root['name'] = successor['name']
-        root['pokedex'] = successor['pokedex']
-        root['right'] = delete_owner_bst(root['right'], successor['name'])
+        # Two children: move the in-order successor (smallest value in the right subtree)
+        # into this spot. The successor node itself is moved, so other references to it stay valid.
+        right, successor = detach_min(node['right'])
+        successor['left'] = node['left']
+        successor['right'] = right
+        if BALANCED_OWNER_TREE:
+            subtree = rebalance(successor)
+        else:
+            update_height(successor)
+            subtree = successor
+    if not path:
+        return subtree
+    return relink_path(path, key, subtree)
 
-    return root
+
+def create_owner(root, owner_name, starter_id):
+    """
+    Create an owner whose pokedex starts with the Pokemon starter_id.
+    Return (updated root, new node), or (root, None) if the owner already exists.
+    """
+    if starter_id not in species()['by id']:
+        raise ValueError(f"ID {starter_id} not found in Honen data.")
+    if find_owner(root, owner_name):
+        return root, None
+    new_node = create_owner_node(owner_name, starter_id)
+    root = insert_owner_bst(root, new_node)
+    publish_owner_root(root)
+    log_operation('create', owner_name, starter_id)
+    if pokedex_listeners:
+        notify_pokedex('add', owner_name, new=species()['by id'][starter_id])
+    return root, new_node
+
+
+def remove_owner(root, owner_name):
+    """
+    Delete an owner and their whole pokedex.
+    Return (updated root, removed node), or (root, None) if there's no such owner.
+    """
+    node = find_owner(root, owner_name)
+    if node is None:
+        return root, None
+    root = delete_owner_bst(root, owner_name)
+    publish_owner_root(root)
+    log_operation('delete', owner_name)
+    if pokedex_listeners:
+        for pokemon in pokedex_pokemon(node):
+            notify_pokedex('remove', node['name'], old=pokemon)
+    return root, node
 
 
 def delete_owner(root):
     name = input('Enter owner to delete: ')
-    if find_owner_bst(root, name):
+    if find_owner(root, name):
         print(f"Deleting {name}'s entire Pokedex...")
-        root = delete_owner_bst(root, name)
+        root, _ = remove_owner(root, name)
         print(f'Pokedex deleted.')
         return root
     else:
@@ -227,85 +895,637 @@ def delete_owner(root):
         return root
 
 
-########################
-# 3) BST Traversals
-########################
+########################
+# 2b) Copy-on-write owner tree
+########################
+# With COPY_ON_WRITE_TREE on, insert/delete and the pokedex operations never change
+# a node that's reachable from an existing root. They copy the nodes on the path
+# they touch (O(log n) for a balanced tree) and return a new root that shares the
+# rest. A root is therefore a frozen snapshot: any thread can traverse it without
+# locks while the writer keeps publishing new roots.
+
+def cow_copy(node):
+    """
+    Return a copy of a node for the next version of the tree (the pokedex is shared),
+    and point owner_index at it.
+    """
+    copy = dict(node)
+    key = node['name'].lower()
+    if owner_index is not None and owner_index.get(key) is node:
+        owner_index[key] = copy
+    return copy
+
+
+def cow_rebalance(node):
+    """
+    rebalance() for a node that's already a private copy: the children a rotation
+    changes are copied first.
+    """
+    update_height(node)
+    balance = node_height(node['left']) - node_height(node['right'])
+    if balance > 1:
+        node['left'] = cow_copy(node['left'])
+        if node_height(node['left']['left']) < node_height(node['left']['right']):
+            node['left']['right'] = cow_copy(node['left']['right'])
+            node['left'] = rotate_left(node['left'])
+        return rotate_right(node)
+    if balance < -1:
+        node['right'] = cow_copy(node['right'])
+        if node_height(node['right']['right']) < node_height(node['right']['left']):
+            node['right']['left'] = cow_copy(node['right']['left'])
+            node['right'] = rotate_right(node['right'])
+        return rotate_left(node)
+    return node
+
+
+def cow_rebuild_path(path, key, subtree):
+    """
+    Copy the nodes of `path` (root first) bottom-up, hanging `subtree` where `key` goes.
+    Return the new root.
+    """
+    for node in reversed(path):
+        node = cow_copy(node)
+        if key < node['name'].lower():
+            node['left'] = subtree
+        else:
+            node['right'] = subtree
+        if BALANCED_OWNER_TREE:
+            subtree = cow_rebalance(node)
+        else:
+            update_height(node)
+            subtree = node
+    return subtree
+
+
+def cow_insert_owner(root, new_node):
+    """
+    insert_owner_bst() without changing any existing node. Return the new root
+    (or False if the owner already exists).
+    """
+    key = new_node['name'].lower()
+    path = []
+    current_root = root
+    while current_root is not None:
+        current_name = current_root['name'].lower()
+        if key == current_name:
+            print(f"Owner '{new_node['name']}' already exists. No new Pokedex created.")
+            return False
+        path.append(current_root)
+        current_root = current_root['left'] if key < current_name else current_root['right']
+    new_node['left'] = new_node['right'] = None
+    new_node['height'] = 1
+    index_owner(new_node)
+    return cow_rebuild_path(path, key, new_node)
+
+
+def cow_detach_min(node):
+    """
+    detach_min() without changing any existing node: return (new subtree, leftmost node).
+    """
+    path = []
+    while node['left'] is not None:
+        path.append(node)
+        node = node['left']
+    subtree = node['right']
+    for parent in reversed(path):
+        parent = cow_copy(parent)
+        parent['left'] = subtree
+        if BALANCED_OWNER_TREE:
+            subtree = cow_rebalance(parent)
+        else:
+            update_height(parent)
+            subtree = parent
+    return subtree, node
+
+
+def cow_delete_owner(root, owner_name):
+    """
+    delete_owner_bst() without changing any existing node. Return the new root.
+    """
+    key = owner_name.lower()
+    path = []
+    current_root = root
+    while current_root is not None and current_root['name'].lower() != key:
+        path.append(current_root)
+        current_root = current_root['left'] if key < current_root['name'].lower() else current_root['right']
+    if current_root is None:
+        return root
+
+    unindex_owner(current_root)
+    if current_root['left'] is None:
+        subtree = current_root['right']
+    elif current_root['right'] is None:
+        subtree = current_root['left']
+    else:
+        right, successor = cow_detach_min(current_root['right'])
+        successor = cow_copy(successor)
+        successor['left'] = current_root['left']
+        successor['right'] = right
+        if BALANCED_OWNER_TREE:
+            subtree = cow_rebalance(successor)
+        else:
+            update_height(successor)
+            subtree = successor
+    return cow_rebuild_path(path, key, subtree)
+
+
+def cow_replace_owner(root, new_node):
+    """
+    Put new_node in place of the node with the same name, copying the path to it.
+    Return the new root.
+    """
+    key = new_node['name'].lower()
+    path = []
+    current_root = root
+    while current_root is not None and current_root['name'].lower() != key:
+        path.append(current_root)
+        current_root = current_root['left'] if key < current_root['name'].lower() else current_root['right']
+    if current_root is None or current_root is new_node:
+        return root
+    new_node['left'] = current_root['left']
+    new_node['right'] = current_root['right']
+    new_node['height'] = current_root['height']
+    if owner_index is not None:
+        owner_index[key] = new_node
+    # No shape change, so cow_rebuild_path won't rotate anything
+    return cow_rebuild_path(path, key, new_node)
+
+
+def publish_owner_root(root):
+    """
+    With COPY_ON_WRITE_TREE, make root the current owner_root. It's a single
+    assignment, so a reader either gets the old tree or the new one, never a mix.
+    """
+    global owner_root, owner_writer
+    if COPY_ON_WRITE_TREE:
+        owner_root = root
+        owner_writer = threading.get_ident()
+
+
+def current_owner_node(owner_node):
+    """
+    Return the owner's node as it is now. With COPY_ON_WRITE_TREE every change replaces
+    an owner's node, so owner_node may be an old version: this finds the newest one
+    (owner_node itself if the owner isn't in the tree).
+    """
+    if not COPY_ON_WRITE_TREE:
+        return owner_node
+    current = find_owner(owner_root, owner_node['name'])
+    return owner_node if current is None else current
+
+
+def begin_owner_change(owner_node):
+    """
+    Return the node a pokedex operation should change, given the owner's current node
+    (see current_owner_node): that node itself, or with COPY_ON_WRITE_TREE a private
+    copy (with its own pokedex) that no reader can see until finish_owner_change().
+    owner_index points at the copy from here on, like cow_copy().
+    """
+    if not COPY_ON_WRITE_TREE or find_owner(owner_root, owner_node['name']) is not owner_node:
+        return owner_node  # not in the tree, so nobody else can see it
+    node = cow_copy(owner_node)
+    node['pokedex'] = owner_node['pokedex'][:]
+    if owner_node['pokedex_bits'] is not None:
+        node['pokedex_bits'] = bytearray(owner_node['pokedex_bits'])
+    return node
+
+
+def finish_owner_change(owner_node):
+    """
+    With COPY_ON_WRITE_TREE, publish a node from begin_owner_change() as part of a new owner_root.
+    """
+    if COPY_ON_WRITE_TREE:
+        publish_owner_root(cow_replace_owner(owner_root, owner_node))
+
+
+def snapshot_owner_tree():
+    """
+    Return a root that won't change under the caller, e.g. to traverse from another thread.
+    With COPY_ON_WRITE_TREE that's just the current owner_root (O(1)); otherwise
+    the tree is copied node by node (pokedexes included).
+    """
+    if COPY_ON_WRITE_TREE:
+        return owner_root
+    copies = {}
+    for node in iter_postorder(owner_root):
+        copy = dict(node)
+        copy['pokedex'] = node['pokedex'][:]
+        if node['pokedex_bits'] is not None:
+            copy['pokedex_bits'] = bytearray(node['pokedex_bits'])
+        copy['left'] = copies.pop(id(node['left']), None)
+        copy['right'] = copies.pop(id(node['right']), None)
+        copies[id(node)] = copy
+    return copies.get(id(owner_root))
+
+
+########################
+# 3) BST Traversals
+########################
+
+def iter_bfs(root):
+    """
+    Yield the nodes in BFS level-order, using a deque as the queue.
+    """
+    if root is None:
+        return
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        yield node
+        if node['left']:
+            queue.append(node['left'])
+        if node['right']:
+            queue.append(node['right'])
+
+
+def iter_preorder(root):
+    """
+    Yield the nodes in pre-order (root -> left -> right), using an explicit stack.
+    """
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        yield node
+        # Push right first so left is handled first
+        if node['right']:
+            stack.append(node['right'])
+        if node['left']:
+            stack.append(node['left'])
+
+
+def iter_inorder(root):
+    """
+    Yield the nodes in in-order (left -> root -> right), using an explicit stack.
+    """
+    stack = []
+    node = root
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node['left']
+        node = stack.pop()
+        yield node
+        node = node['right']
+
+
+def iter_inorder_from(root, low=None, after=None):
+    """
+    Yield the nodes in in-order, starting at the first name >= low (or > after),
+    case-insensitive. The way down to the start skips every subtree that's entirely
+    before it, so getting the first node costs O(height), not a walk from the left end.
+    """
+    if after is not None:
+        bound, strict = after.lower(), True
+    else:
+        bound, strict = (low.lower() if low is not None else None), False
+    stack = []
+    node = root
+    while node is not None:
+        name = node['name'].lower()
+        if bound is None or name > bound or (name == bound and not strict):
+            stack.append(node)
+            node = node['left']
+        else:
+            node = node['right']
+    while stack:
+        node = stack.pop()
+        yield node
+        node = node['right']
+        while node is not None:
+            stack.append(node)
+            node = node['left']
+
+
+def iter_postorder(root):
+    """
+    Yield the nodes in post-order (left -> right -> root), using an explicit stack.
+    """
+    stack = []
+    node = root
+    last_yielded = None
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node['left']
+        top = stack[-1]
+        if top['right'] is not None and top['right'] is not last_yielded:
+            # Right subtree not done yet
+            node = top['right']
+        else:
+            stack.pop()
+            last_yielded = top
+            yield top
+
+
+def write_owners(owners, sink=None):
+    """
+    Write each owner's name and pokedex (see print_owner) to sink.
+    Without a sink, everything goes to stdout in chunks.
+    """
+    own_sink = sink is None
+    if own_sink:
+        sink = make_output_sink()
+    for owner in owners:
+        print_owner(owner, sink)
+    if own_sink:
+        flush_output_sink(sink)
+
+
+def bfs_traversal(root, sink=None):
+    """
+    BFS level-order traversal. Print each owner's name and pokedex.
+    """
+    write_owners(iter_bfs(root), sink)
+
+
+def pre_order(root, sink=None):
+    """
+    Pre-order traversal (root -> left -> right). Print data for each node.
+    """
+    write_owners(iter_preorder(root), sink)
+
+
+def in_order(root, sink=None):
+    """
+    In-order traversal (left -> root -> right). Print data for each node.
+    """
+    write_owners(iter_inorder(root), sink)
+
+
+def post_order(root, sink=None):
+    """
+    Post-order traversal (left -> right -> root). Print data for each node.
+    """
+    write_owners(iter_postorder(root), sink)
+
+
+def owners_between(root, low, high=None, limit=None):
+    """
+    Return the owners whose names (case-insensitive) are >= low and < high, in name
+    order: owners_between(root, "m", "p") gives the names starting with m, n or o.
+    Without high the range is open-ended. Costs O(height + owners returned).
+    """
+    high = high.lower() if high is not None else None
+    owners = []
+    for node in iter_inorder_from(root, low=low):
+        if (high is not None and node['name'].lower() >= high) or len(owners) == limit:
+            break
+        owners.append(node)
+    return owners
+
+
+def owners_with_prefix(root, prefix, limit=None):
+    """
+    Return the owners whose names start with prefix (case-insensitive), in name order.
+    """
+    prefix = prefix.lower()
+    owners = []
+    for node in iter_inorder_from(root, low=prefix):
+        if not node['name'].lower().startswith(prefix) or len(owners) == limit:
+            break
+        owners.append(node)
+    return owners
+
+
+def owners_page(root, limit, after=None, prefix=None, low=None, high=None):
+    """
+    Return one page of owners in name order: (up to `limit` owners, cursor), where
+    the page starts right after the owner named `after` and cursor is the `after`
+    for the next page (None on the last one). prefix, low and high narrow it down
+    like owners_with_prefix / owners_between. Each page costs O(height + limit),
+    wherever it is in the tree. limit must be at least 1 (ValueError otherwise).
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    prefix = prefix.lower() if prefix is not None else None
+    high = high.lower() if high is not None else None
+    start = max(prefix or '', low.lower() if low is not None else '')
+    if after is not None and after.lower() >= start:
+        nodes = iter_inorder_from(root, after=after)
+    else:
+        nodes = iter_inorder_from(root, low=start)
+    page = []
+    for node in nodes:
+        name = node['name'].lower()
+        if (prefix is not None and not name.startswith(prefix)) or (high is not None and name >= high):
+            break
+        if len(page) == limit:
+            return page, page[-1]['name']
+        page.append(node)
+    return page, None
+
+
+########################
+# 4) Pokedex Operations
+########################
+
+def pokedex_has(owner_node, poke_id):
+    """
+    Return True if poke_id is in the owner's pokedex. O(1) with the bitmap,
+    otherwise a scan of at most POKEDEX_BITMAP_MIN IDs (in C).
+    """
+    bits = owner_node['pokedex_bits']
+    if bits is None:
+        return poke_id in owner_node['pokedex']
+    index = poke_id >> 3
+    return 0 <= index < len(bits) and bits[index] >> (poke_id & 7) & 1 == 1
+
+
+def set_pokedex_bit(bits, poke_id, caught):
+    index = poke_id >> 3
+    if caught:
+        if index >= len(bits):
+            bits.extend(bytes(index + 1 - len(bits)))
+        bits[index] |= 1 << (poke_id & 7)
+    else:
+        bits[index] &= ~(1 << (poke_id & 7)) & 0xFF
+
+
+def pokedex_append(owner_node, poke_id):
+    """
+    Append an ID (not already there) to the owner's pokedex, starting the bitmap
+    once it outgrows POKEDEX_BITMAP_MIN. Leaves the indexes alone (see pokedex_add).
+    """
+    pokedex = owner_node['pokedex']
+    pokedex.append(poke_id)
+    bits = owner_node['pokedex_bits']
+    if bits is not None:
+        set_pokedex_bit(bits, poke_id, True)
+    elif len(pokedex) > POKEDEX_BITMAP_MIN:
+        bits = owner_node['pokedex_bits'] = bytearray()
+        for caught_id in pokedex:
+            set_pokedex_bit(bits, caught_id, True)
+
+
+def pokedex_pokemon(owner_node):
+    """
+    Return the Pokemon dicts of the owner's pokedex, in the order they were caught.
+    """
+    return list(map(species()['by id'].__getitem__, owner_node['pokedex']))
+
+
+def pokedex_add(owner_node, pokemon):
+    """
+    Append a Pokemon dict to the owner's pokedex. Return False if it's already there.
+    """
+    poke_id = pokemon['ID']
+    if pokedex_has(owner_node, poke_id):
+        return False
+    pokedex_append(owner_node, poke_id)
+    rerank_owner(owner_node, len(owner_node['pokedex']) - 1)
+    add_species_owner(owner_node, poke_id)
+    return True
+
+
+def pokedex_remove(owner_node, poke_id):
+    """
+    Remove a Pokemon from the owner's pokedex by ID. Return the removed dict, or None.
+    Unlike add and the duplicate check this is O(pokedex size): array.remove scans
+    for the slot and the IDs after it shift down by one. A pokedex holds each species
+    at most once, so that's bounded by the species count (a few us for a full Hoenn
+    pokedex, see pokedex_remove/hoenn in pokedex_bench --suite). Nearly all of it is
+    the scan, which a tombstone wouldn't save without a per-owner ID -> slot map.
+    """
+    if not pokedex_has(owner_node, poke_id):
+        return None
+    pokedex = owner_node['pokedex']
+    pokedex.remove(poke_id)
+    if owner_node['pokedex_bits'] is not None:
+        set_pokedex_bit(owner_node['pokedex_bits'], poke_id, False)
+    rerank_owner(owner_node, len(pokedex) + 1)
+    drop_species_owner(owner_node, poke_id)
+    return species()['by id'][poke_id]
+
+
+def watch_pokedex(callback):
+    """
+    Call callback(event) after every change the pokedex operations below make, with
+    event a dict: 'event' ('add', 'remove' or 'replace'), 'owner' (name), 'old' and
+    'new' (Pokemon dicts, None where it doesn't apply). A 'replace' (evolve) takes
+    'old' out and appends 'new' at the end, like the pokedex does.
+    Callbacks run on the thread making the change, so they should be quick
+    (e.g. put the event on a queue).
+    """
+    pokedex_listeners.append(callback)
+
+
+def unwatch_pokedex(callback):
+    if callback in pokedex_listeners:
+        pokedex_listeners.remove(callback)
+
 
-def bfs_traversal(root):
+def notify_pokedex(event, owner_name, old=None, new=None):
     """
-    BFS level-order traversal. Print each owner's name and # of pokemons.
+    Tell the pokedex_listeners about one change.
     """
-    pass
+    for callback in list(pokedex_listeners):
+        callback({'event': event, 'owner': owner_name, 'old': old, 'new': new})
 
 
-def pre_order(root):
+def pokedex_find_by_name(owner_node, name):
     """
-    Pre-order traversal (root -> left -> right). Print data for each node.
+    Return the Pokemon dict with this name (case-insensitive) from the owner's pokedex, or None.
     """
-    pass
+    pokemon = species()['by name'].get(name.lower())
+    if pokemon is None or not pokedex_has(owner_node, pokemon['ID']):
+        return None
+    return pokemon
 
 
-def in_order(root):
+def add_pokemon(owner_node, poke_id):
     """
-    In-order traversal (left -> root -> right). Print data for each node.
+    Add the Pokemon poke_id to the owner's pokedex.
+    Return (status, Pokemon dict or None); status is 'added', 'duplicate' or 'not found'.
     """
-    pass
+    pokemon = species()['by id'].get(poke_id)
+    if pokemon is None:
+        return 'not found', None
+    node = current_owner_node(owner_node)
+    if pokedex_has(node, poke_id):
+        return 'duplicate', pokemon
+    node = begin_owner_change(node)
+    pokedex_add(node, pokemon)
+    finish_owner_change(node)
+    log_operation('add', node['name'], poke_id)
+    if pokedex_listeners:
+        notify_pokedex('add', node['name'], new=pokemon)
+    return 'added', pokemon
+
+
+def release_pokemon(owner_node, pokemon_name):
+    """
+    Remove a Pokemon (by name, case-insensitive) from the owner's pokedex.
+    Return the released Pokemon dict, or None if it isn't there.
+    """
+    node = current_owner_node(owner_node)
+    pokemon = pokedex_find_by_name(node, pokemon_name)
+    if pokemon is None:
+        return None
+    node = begin_owner_change(node)
+    pokedex_remove(node, pokemon['ID'])
+    finish_owner_change(node)
+    log_operation('release', node['name'], pokemon['ID'])
+    if pokedex_listeners:
+        notify_pokedex('remove', node['name'], old=pokemon)
+    return pokemon
 
 
-def post_order(root):
+def evolve_pokemon(owner_node, pokemon_name):
     """
-    Post-order traversal (left -> right -> root). Print data for each node.
+    Evolve a Pokemon (by name, case-insensitive) in the owner's pokedex.
+    Return (status, old Pokemon dict, evolved Pokemon dict); status is
+      'evolved', 'duplicate' (the evolution was already there, so only the old one is gone),
+      'not found' or 'cannot evolve'.
     """
-    pass
-
+    node = current_owner_node(owner_node)
+    pokemon = pokedex_find_by_name(node, pokemon_name)
+    if pokemon is None:
+        return 'not found', None, None
+    evolution_id = species()['evolutions'].get(pokemon['ID'])
+    if evolution_id is None:
+        return 'cannot evolve', pokemon, None
+
+    evolved_pokemon = species()['by id'][evolution_id]
+    node = begin_owner_change(node)
+    pokedex_remove(node, pokemon['ID'])
+    status = 'duplicate' if pokedex_has(node, evolution_id) else 'evolved'
+    if status == 'evolved':
+        pokedex_add(node, evolved_pokemon)
+    finish_owner_change(node)
+    log_operation('evolve', node['name'], pokemon['ID'])
+    if pokedex_listeners:
+        if status == 'evolved':
+            notify_pokedex('replace', node['name'], old=pokemon, new=evolved_pokemon)
+        else:
+            notify_pokedex('remove', node['name'], old=pokemon)
+    return status, pokemon, evolved_pokemon
 
-########################
-# 4) Pokedex Operations
-########################
 
 def add_pokemon_to_owner(owner_node):
     """
     Prompt user for a Pokemon ID, find the data, and add to this owner's pokedex if not duplicate.
     """
-    valid_choice = False
-    poke_id = -1
-    while not valid_choice:
-        poke_id = input("Enter Pokemon ID to add: ")
-        if not poke_id.isdecimal():
-            print(f"ID {poke_id} not found in Honen data.")
-            return
-        poke_id = int(poke_id)
-        if poke_id < 1 or poke_id > 135:
-            print(f"ID {poke_id} not found in Honen data.")
-            return
-        valid_choice = True
-    # Get all pokemon IDs
-    pokemons_ids = [pokemon['ID'] for pokemon in owner_node['pokedex']]
-    if poke_id in pokemons_ids:
-        print("Pokemon already in the list. No changes made.")
+    poke_id = input("Enter Pokemon ID to add: ")
+    if not poke_id.isdecimal():
+        print(f"ID {poke_id} not found in Honen data.")
         return
-    pokemon_data = HOENN_DATA[poke_id - 1]
-    owner_node['pokedex'].append(pokemon_data)
-    print(f"Pokemon {pokemon_data['Name']} (ID {pokemon_data['ID']}) added to {owner_node['name']}'s Pokedex.")
+    status, pokemon_data = add_pokemon(owner_node, int(poke_id))
+    if status == 'not found':
+        print(f"ID {int(poke_id)} not found in Honen data.")
+    elif status == 'duplicate':
+        print("Pokemon already in the list. No changes made.")
+    else:
+        print(f"Pokemon {pokemon_data['Name']} (ID {pokemon_data['ID']}) added to {owner_node['name']}'s Pokedex.")
 
 
 def release_pokemon_by_name(owner_node):
     """
     Prompt user for a Pokemon name, remove it from this owner's pokedex if found.
     """
-    # Enumerate returns a tuple: (index, pokemon)
-    index_to_remove = -1
-    pokemon_name = ''
     name = input("Enter Pokemon Name to release: ")
-    name_lower = name.lower()
-    for index, pokemon in enumerate(owner_node['pokedex']):
-        pokemon_name = pokemon['Name']
-        if pokemon_name.lower() == name_lower:
-            index_to_remove = index
-            break  # found it, stop searching
-    if index_to_remove != -1:
-        print(f"Releasing {pokemon_name} from {owner_node['name']}.")
-        owner_node['pokedex'].pop(index_to_remove)
+    pokemon = release_pokemon(owner_node, name)
+    if pokemon is not None:
+        print(f"Releasing {pokemon['Name']} from {owner_node['name']}.")
     else:
         print(f"No Pokemon named '{name}' in {owner_node['name']}'s Pokedex.")
 
@@ -319,106 +1539,332 @@ def evolve_pokemon_by_name(owner_node):
     4) If new is a duplicate, remove it immediately
     """
     name = input('Enter Pokemon Name to evolve: ')
-    name_lower = name.lower()
-    index_to_remove = -1
-    pokemon_to_evolve = None
-    pokemon_name = ''
-
-    # find pokemon
-    for index, pokemon in enumerate(owner_node['pokedex']):
-        pokemon_name = pokemon['Name']
-        if pokemon_name.lower() == name_lower:
-            index_to_remove = index
-            pokemon_to_evolve = pokemon
-            break  # found it, stop searching
-
-    if index_to_remove == -1:
+    status, pokemon, evolved_pokemon = evolve_pokemon(owner_node, name)
+
+    if status == 'not found':
         print(f"No Pokemon named '{name}' in {owner_node['name']}'s Pokedex.")
         return
-    if pokemon_to_evolve['Can Evolve'] == 'FALSE':
+    if status == 'cannot evolve':
         print(f"{name} cannot evolve.")
         return
 
-    # Else, Find evolution
-    evolution_id = pokemon_to_evolve['ID'] + 1
-    evolved_pokemon = HOENN_DATA[evolution_id - 1]
-    print(f"Pokemon evolved from {pokemon_name} (ID {evolution_id - 1})"
-          f" to {evolved_pokemon['Name']} (ID {evolution_id}).")
-
-    # Remove old
-    owner_node['pokedex'].pop(index_to_remove)
-
-    if evolved_pokemon in owner_node['pokedex']:
+    print(f"Pokemon evolved from {pokemon['Name']} (ID {pokemon['ID']})"
+          f" to {evolved_pokemon['Name']} (ID {evolved_pokemon['ID']}).")
+    if status == 'duplicate':
         # Display this message, but nothing left to do
         print(f'{evolved_pokemon["Name"]} was already present; releasing it immediately.')
-    else:
-        # Actually add the evolution to the list
-        owner_node['pokedex'].append(evolved_pokemon)
 
 
 ########################
 # 5) Sorting Owners by # of Pokemon
 ########################
-def gather_all_owners_inner(root, arr):
-    if not root:
-        return []
-    arr.append(root)
-    if root['left']:
-        arr = gather_all_owners_inner(root['left'], arr)
-    if root['right']:
-        arr = gather_all_owners_inner(root['right'], arr)
-    return arr
-
-
 def gather_all_owners(root):
     """
     Collect all BST nodes into a list (arr).
     """
-    return gather_all_owners_inner(root, [])
+    return list(iter_preorder(root))
+
+
+def unrank_owner(owner_node, size):
+    """
+    Remove an owner's (size, name) entry from owner_ranking, if it's there.
+    """
+    if owner_ranking is None:
+        return
+    key = (size, owner_node['name'].lower())
+    index = bisect_left(owner_ranking, key)
+    if index < len(owner_ranking) and owner_ranking[index] == key:
+        owner_ranking.pop(index)
 
 
-def sort_owners_by_num_pokemon(root):
+def rerank_owner(owner_node, old_size):
     """
-    Gather owners, sort them by (#pokedex size, then alpha), print results.
+    Move an owner to its new place in owner_ranking after its pokedex changed size.
+    Owners that aren't in the tree (see owner_indexed) are left alone.
     """
-    owners_arr: list = gather_all_owners(root)
-    if not owners_arr:
-        print('No owners at all.')
+    if owner_ranking is None or not owner_indexed(owner_node):
         return
-    is_sorted = False
-    while not is_sorted:
-        is_sorted = True
-        for index in range(len(owners_arr) - 1):
-            current_len = len(owners_arr[index]['pokedex'])
-            next_len = len(owners_arr[index + 1]['pokedex'])
-            if current_len == next_len:
-                current_name = owners_arr[index]['name']
-                current_name = current_name.lower()
-                next_name = owners_arr[index + 1]['name']
-                next_name = next_name.lower()
-                if current_name > next_name:
-                    # "Swap"
-                    temp = owners_arr.pop(index + 1)
-                    owners_arr.insert(index, temp)
-                    is_sorted = False
-            elif current_len > next_len:
-                # "Swap"
-                temp = owners_arr.pop(index + 1)
-                owners_arr.insert(index, temp)
-                is_sorted = False
-
-    print('=== The Owners we have, sorted by number of Pokemons ===')
-    for owner in owners_arr:
-        print(f"Owner: {owner['name']} (has {len(owner['pokedex'])} Pokemon)")
+    key = (old_size, owner_node['name'].lower())
+    index = bisect_left(owner_ranking, key)
+    if index < len(owner_ranking) and owner_ranking[index] == key:
+        owner_ranking.pop(index)
+        insort(owner_ranking, (len(owner_node['pokedex']), key[1]))
+
+
+def owners_by_num_pokemon(root):
+    """
+    Return the owners sorted by (#pokedex size, then alpha).
+    Reads owner_ranking when it covers root (see indexes_cover), otherwise sorts
+    the tree's nodes, so a snapshot gets its own owners.
+    """
+    if owner_ranking is not None and indexes_cover(root):
+        return [owner_index[entry[1]] for entry in owner_ranking]
+    return sorted(gather_all_owners(root), key=lambda owner: (len(owner['pokedex']), owner['name'].lower()))
+
+
+def top_owners(k):
+    """
+    Return the k owners with the most Pokemon, biggest pokedex first. O(k).
+    Needs owner_ranking to be enabled.
+    """
+    if k <= 0:
+        return []
+    return [owner_index[entry[1]] for entry in reversed(owner_ranking[-k:])]
+
+
+def sort_owners_by_num_pokemon(root, sink=None):
+    """
+    Gather owners, sort them by (#pokedex size, then alpha), print results
+    (to sink if given, e.g. the null sink for benchmarks).
+    """
+    own_sink = sink is None
+    if own_sink:
+        sink = make_output_sink()
+    if root is None:
+        sink_write(sink, 'No owners at all.')
+    else:
+        owners_arr = owners_by_num_pokemon(root)
+        sink_write(sink, '=== The Owners we have, sorted by number of Pokemons ===')
+        sink_extend(sink, [f"Owner: {owner['name']} (has {len(owner['pokedex'])} Pokemon)" for owner in owners_arr])
+    if own_sink:
+        flush_output_sink(sink)
+
+
+########################
+# 5b) Whole-tree reports
+########################
+# On the live tree the reports read the indexes (owner_ranking, species_owners), which
+# the tree operations keep up to date, so they cost about as much as their result.
+# Without them (indexes off, or a snapshot) they look at every pokedex, on a flat export
+# of the tree instead of the node dicts: 'offsets' (array('Q'), owner i's Pokemon are ids[offsets[i]:offsets[i+1]])
+# and 'ids' (an array like the pokedexes'), in owner name order. For big trees the export goes into one
+# shared memory block; each worker process aggregates a range of owners and only
+# the small partial results (counters, top-k positions) are pickled back.
+
+def export_pokedex_columns(root):
+    """
+    Return (owners in name order, offsets, ids) for the reports below.
+    """
+    owners = list(iter_inorder(root))
+    offsets = array('Q', [0])
+    ids = array(species()['pokedex typecode'])
+    for node in owners:
+        ids.extend(node['pokedex'])
+        offsets.append(len(ids))
+    return owners, offsets, ids
+
+
+def aggregate_owner_range(offsets, ids, start, end, report, arg):
+    """
+    Compute one report over owners start..end-1 of an export. The results merge
+    across ranges by adding counters or combining lists (see merge_owner_reports):
+      'species counts': Counter of Pokemon ID -> number of owners that have it
+      'pokedex sizes':  Counter of pokedex size -> number of owners
+      'top':            positions of the `arg` owners with the most Pokemon
+    """
+    if report == 'species counts':
+        return Counter(ids[offsets[start]:offsets[end]])
+    if report == 'pokedex sizes':
+        return Counter(offsets[i + 1] - offsets[i] for i in range(start, end))
+    if report == 'top':
+        # Positions are in name order, so this ties like top_owners()
+        return nlargest(arg, range(start, end), key=lambda i: (offsets[i + 1] - offsets[i], i))
+    raise ValueError(f"unknown report '{report}'")
+
+
+def aggregate_shared_range(block_name, owner_count, id_count, typecode, start, end, report, arg):
+    """
+    aggregate_owner_range() in a worker process, on the export in shared memory block_name
+    (its ids of array typecode `typecode`).
+    """
+    block = shared_memory.SharedMemory(name=block_name)
+    ids_start = (owner_count + 1) * 8
+    offsets = block.buf[:ids_start].cast('Q')
+    ids = block.buf[ids_start:ids_start + id_count * array(typecode).itemsize].cast(typecode)
+    try:
+        return aggregate_owner_range(offsets, ids, start, end, report, arg)
+    finally:
+        offsets.release()
+        ids.release()
+        block.close()
+
+
+def merge_owner_reports(partials, offsets, report, arg):
+    """
+    Combine the results of aggregate_owner_range() over consecutive ranges of an export.
+    """
+    if report in ('species counts', 'pokedex sizes'):
+        total = Counter()
+        for partial in partials:
+            total.update(partial)
+        return total
+    # 'top': the top k of the ranges' top ks
+    positions = [i for partial in partials for i in partial]
+    return nlargest(arg, positions, key=lambda i: (offsets[i + 1] - offsets[i], i))
+
+
+def report_workers(workers=None):
+    """
+    Return (report_pool, its number of workers), starting the pool with `workers`
+    processes (default: one per CPU) if there's none yet, or none of that size.
+    """
+    global report_pool, report_pool_workers
+    workers = workers or os.cpu_count() or 1
+    with report_pool_lock:
+        if report_pool is not None and report_pool_workers != workers:
+            report_pool.shutdown()
+            report_pool = None
+        if report_pool is None:
+            report_pool = ProcessPoolExecutor(max_workers=workers)
+            report_pool_workers = workers
+        return report_pool, workers
+
+
+def close_report_pool():
+    """
+    Stop the report worker processes, if they were started.
+    """
+    global report_pool
+    with report_pool_lock:
+        if report_pool is not None:
+            report_pool.shutdown()
+            report_pool = None
+
+
+def owner_report(root, report, arg=None, workers=None):
+    """
+    Run a report (see aggregate_owner_range) over every owner of the tree.
+    Return (owners in name order, result). Trees with at least PARALLEL_MIN_OWNERS owners
+    are split into ranges over report_pool.
+    """
+    owners, offsets, ids = export_pokedex_columns(root)
+    if len(owners) < PARALLEL_MIN_OWNERS or workers == 1:
+        return owners, aggregate_owner_range(offsets, ids, 0, len(owners), report, arg)
+
+    pool, workers = report_workers(workers)
+    # A few ranges per worker, so one slow range doesn't leave the others idle
+    step = -(-len(owners) // (workers * 4))
+    ranges = [(start, min(start + step, len(owners))) for start in range(0, len(owners), step)]
+    ids_start = len(offsets) * 8
+    ids_size = len(ids) * ids.itemsize
+    block = shared_memory.SharedMemory(create=True, size=max(1, ids_start + ids_size))
+    try:
+        block.buf[:ids_start] = offsets.tobytes()
+        block.buf[ids_start:ids_start + ids_size] = ids.tobytes()
+        futures = [pool.submit(aggregate_shared_range, block.name, len(owners), len(ids), ids.typecode,
+                               start, end, report, arg) for start, end in ranges]
+        partials = [future.result() for future in futures]
+    finally:
+        block.close()
+        block.unlink()
+    return owners, merge_owner_reports(partials, offsets, report, arg)
+
+
+def pokedex_size_histogram(root, workers=None):
+    """
+    Return {pokedex size: number of owners}, smallest size first.
+    Reads owner_ranking when it covers root: one bisect per distinct size.
+    """
+    if owner_ranking is None or not indexes_cover(root):
+        _, counts = owner_report(root, 'pokedex sizes', workers=workers)
+        return dict(sorted(counts.items()))
+    counts = {}
+    index = 0
+    while index < len(owner_ranking):
+        size = owner_ranking[index][0]
+        # (size + 1,) sorts before every (size + 1, name)
+        end = bisect_left(owner_ranking, (size + 1,), index)
+        counts[size] = end - index
+        index = end
+    return counts
+
+
+def type_distribution(root, workers=None):
+    """
+    Return {type: number of Pokemon of that type across all pokedexes}, most common
+    first (ties by type name). Reads species_owners when it covers root: one set size per species.
+    """
+    if species_owners is None or not indexes_cover(root):
+        _, counts = owner_report(root, 'species counts', workers=workers)
+    else:
+        counts = {poke_id: len(owner_keys) for poke_id, owner_keys in species_owners.items()}
+    by_id = species()['by id']
+    types = Counter()
+    for poke_id, count in counts.items():
+        types[by_id[poke_id]['Type']] += count
+    return dict(sorted(types.items(), key=lambda item: (-item[1], item[0])))
+
+
+def largest_owners(root, k, workers=None):
+    """
+    Return the k owners with the most Pokemon, biggest pokedex first (ties like top_owners).
+    Reads owner_ranking when it covers root, otherwise works it out from every pokedex.
+    """
+    if k <= 0:
+        return []
+    if owner_ranking is not None and indexes_cover(root):
+        return top_owners(k)
+    owners, positions = owner_report(root, 'top', k, workers=workers)
+    return [owners[i] for i in positions]
+
+
+def owners_of_species(root, *poke_ids):
+    """
+    Return the owners (in name order) that have all of the given Pokemon.
+    Reads species_owners when it covers root (see indexes_cover), so the cost follows
+    the rarest species' owner count rather than the size of the tree; otherwise
+    scans every pokedex.
+    """
+    if species_owners is None or not indexes_cover(root):
+        return [node for node in iter_inorder(root) if all(pokedex_has(node, poke_id) for poke_id in poke_ids)]
+    owner_sets = sorted((species_owners.get(poke_id, set()) for poke_id in poke_ids), key=len)
+    if not owner_sets:
+        return []
+    # set.intersection walks the smaller side, so start from the rarest species
+    owner_keys = owner_sets[0].intersection(*owner_sets[1:])
+    return [find_owner(root, key) for key in sorted(owner_keys)]
+
+
+def species_popularity(root, k=None):
+    """
+    Return [(Pokemon dict, number of owners)] for the species anyone has, most owned
+    first (ties by ID). With k, only the top k.
+    """
+    by_id = species()['by id']
+    if species_owners is None or not indexes_cover(root):
+        counts = Counter(poke_id for node in iter_inorder(root) for poke_id in node['pokedex'])
+    else:
+        counts = {poke_id: len(owner_keys) for poke_id, owner_keys in species_owners.items()}
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    if k is not None:
+        ranked = ranked[:k]
+    return [(by_id[poke_id], count) for poke_id, count in ranked]
+
+
+def co_owned_species(root, poke_id, k=10):
+    """
+    Return [(Pokemon dict, number of owners)] for the k species most often owned
+    together with poke_id. Only the pokedexes of poke_id's owners are read.
+    """
+    counts = Counter()
+    for node in owners_of_species(root, poke_id):
+        counts.update(node['pokedex'])
+    counts.pop(poke_id, None)
+    by_id = species()['by id']
+    return [(by_id[other_id], count) for other_id, count in
+            sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:k]]
 
 
 ########################
 # 6) Print All
 ########################
-def print_owner(owner):
-    print()
-    print(f'Owner: {owner["name"]}')
-    display_pokemon_list(owner["pokedex"])
+def print_owner(owner, sink=None):
+    if sink is None:
+        write_owners([owner])
+        return
+    sink_write(sink, '')
+    sink_write(sink, f'Owner: {owner["name"]}')
+    sink_extend(sink, list(map(species()['display lines'].__getitem__, owner["pokedex"])))
 
 
 def print_all_owners(root):
@@ -445,55 +1891,102 @@ def print_all_owners(root):
 
 def bfs_print(node):
     """
-    Helper to print data in pre-order.
+    Helper to print data in BFS level-order.
     """
-    queue = [node]
-    while queue:
-        current_node = queue.pop(0)
-        print_owner(current_node)
-        if current_node["left"]:
-            queue.append(current_node["left"])
-        if current_node["right"]:
-            queue.append(current_node["right"])
+    bfs_traversal(node)
 
 
 def pre_order_print(node):
     """
     Helper to print data in pre-order.
     """
-    print_owner(node)
-    if node["left"]:
-        pre_order_print(node["left"])
-    if node["right"]:
-        pre_order_print(node["right"])
+    pre_order(node)
 
 
 def in_order_print(node):
     """
     Helper to print data in in-order.
     """
-    if node["left"]:
-        in_order_print(node["left"])
-    print_owner(node)
-    if node["right"]:
-        in_order_print(node["right"])
+    in_order(node)
 
 
 def post_order_print(node):
     """
     Helper to print data in post-order.
     """
-    if node["left"]:
-        post_order_print(node["left"])
-    if node["right"]:
-        post_order_print(node["right"])
-    print_owner(node)
+    post_order(node)
 
 
 ########################
 # 7) The Display Filter Sub-Menu
 ########################
 
+def species_mask(pokemon_type=None, evolvable=None, attack_above=None, hp_above=None, name_prefix=None):
+    """
+    Return the filter_pokedex criteria as a mask over species IDs: bytes where
+    mask[ID] is 1 if that species matches every given criterion (None if none is given).
+    Each criterion is one bytes.translate() of a by-ID column (see build_species_columns),
+    and the masks are ANDed as big ints, so it all runs in C; only the name prefix
+    goes through its (few) matching IDs.
+    """
+    columns = species()['columns']
+    by_id = columns['by id']
+    size = len(by_id['Type'])
+    masks = []
+    if pokemon_type is not None:
+        table = bytearray(256)
+        type_code = columns['type codes'].get(pokemon_type.lower())
+        if type_code is not None:
+            table[type_code] = 1
+        masks.append(by_id['Type'].translate(table))
+    if evolvable is not None:
+        can_evolve = by_id['Can Evolve']
+        masks.append(can_evolve if evolvable else can_evolve.translate(b'\x01' + bytes(255)))
+    for column, above in (('Attack', attack_above), ('HP', hp_above)):
+        if above is None:
+            continue
+        if by_id[column] is not None:
+            masks.append(by_id[column].translate(bytes(value > above for value in range(256))))
+        else:
+            mask = bytearray(size)
+            for poke_id, value in zip(columns['ID'], columns[column]):
+                mask[poke_id] = value > above
+            masks.append(mask)
+    if name_prefix is not None:
+        mask = bytearray(size)
+        for poke_id in species_ids_with_prefix(name_prefix):
+            mask[poke_id] = 1
+        masks.append(mask)
+
+    if not masks:
+        return None
+    if len(masks) == 1:
+        return masks[0]
+    combined = int.from_bytes(masks[0], 'little')
+    for mask in masks[1:]:
+        combined &= int.from_bytes(mask, 'little')
+    return combined.to_bytes(size, 'little')
+
+
+def filter_pokedex(owner_node, pokemon_type=None, evolvable=None,
+                   attack_above=None, hp_above=None, name_prefix=None):
+    """
+    Return the owner's Pokemon dicts (in pokedex order) matching every given criterion:
+      pokemon_type: type name, case-insensitive
+      evolvable:    True / False
+      attack_above: Attack > value
+      hp_above:     HP > value
+      name_prefix:  name starts with these letter(s), case-insensitive
+    The criteria become one mask over species IDs (see species_mask), so however
+    many are combined, the pokedex is only read once, with one byte lookup per ID.
+    """
+    pokedex = owner_node['pokedex']
+    mask = species_mask(pokemon_type, evolvable, attack_above, hp_above, name_prefix)
+    if mask is not None:
+        pokedex = [poke_id for poke_id in pokedex if mask[poke_id]]
+    return list(map(species()['by id'].__getitem__, pokedex))
+
+
 def display_filter_sub_menu(owner_node):
     """
     1) Only type X
@@ -510,18 +2003,10 @@ def display_filter_sub_menu(owner_node):
         choice = input("Your choice: ")
         pokemon_list = []
         if choice == '1':
-            lower_type = input("Which Type? (e.g. GRASS, WATER): ")
-            lower_type = lower_type.lower()
-
-            for pokemon in owner_node['pokedex']:
-                if pokemon['Type'].lower() == lower_type:
-                    pokemon_list.append(pokemon)
-
-            # In one line:
-            # pokemon_list = [pokemon for pokemon in owner_node['pokedex'] if pokemon['Type'].lower() == lower_type]
+            pokemon_type = input("Which Type? (e.g. GRASS, WATER): ")
+            pokemon_list = filter_pokedex(owner_node, pokemon_type=pokemon_type)
         elif choice == '2':
-            # Note that for some dumb reason "can evolve" is a string and not a bool
-            pokemon_list = [pokemon for pokemon in owner_node['pokedex'] if pokemon['Can Evolve'] == 'TRUE']
+            pokemon_list = filter_pokedex(owner_node, evolvable=True)
         elif choice == '3':
 
             while True:
@@ -542,12 +2027,7 @@ def display_filter_sub_menu(owner_node):
                     print("Invalid input.")
 
             attack_threshold = int(attack_threshold)
-            for pokemon in owner_node['pokedex']:
-                if pokemon['Attack'] > attack_threshold:
-                    pokemon_list.append(pokemon)
-
-            # In one line:
-            # pokemon_list = [pokemon for pokemon in owner_node['pokedex'] if pokemon['Attack'] > attack_threshold]
+            pokemon_list = filter_pokedex(owner_node, attack_above=attack_threshold)
         elif choice == '4':
             while True:
                 hp_threshold = input("Enter HP threshold: ")
@@ -567,23 +2047,12 @@ def display_filter_sub_menu(owner_node):
                     print("Invalid input.")
 
             hp_threshold = int(hp_threshold)
-            for pokemon in owner_node['pokedex']:
-                if pokemon['HP'] > hp_threshold:
-                    pokemon_list.append(pokemon)
-            # In one line:
-            # pokemon_list = [pokemon for pokemon in owner_node['pokedex'] if pokemon['HP'] > hp_threshold]
+            pokemon_list = filter_pokedex(owner_node, hp_above=hp_threshold)
         elif choice == '5':
             letters = input("Starting letter(s): ")
-            lower_letters = letters.lower()
-            for pokemon in owner_node['pokedex']:
-                name_lower = pokemon['Name'].lower()
-                if name_lower.startswith(lower_letters):
-                    pokemon_list.append(pokemon)
-            # In one line:
-            # pokemon_list = [pokemon for pokemon in owner_node['pokedex']
-            #                 if pokemon['Name'].lower().startswith(lower_letters)]
+            pokemon_list = filter_pokedex(owner_node, name_prefix=letters)
         elif choice == '6':
-            pokemon_list = [pokemon for pokemon in owner_node['pokedex']]
+            pokemon_list = filter_pokedex(owner_node)
         elif choice == '7':
             print("Back to Pokedex Menu.")
             break
@@ -594,15 +2063,677 @@ def display_filter_sub_menu(owner_node):
 
 
 ########################
-# 8) Sub-menu & Main menu
+# 8) Persistence
+########################
+
+def open_owner_store(directory):
+    """
+    Load the owner tree saved in `directory` and start logging to it. Return the root.
+    The store is a snapshot ('owners.jsonl', one owner per line, in pre-order, which
+    pins down the tree's shape; see link_preorder) plus an append-only operation log
+    ('operations.jsonl') of everything done since. Every line carries a sequence
+    number, so log entries already in the snapshot are skipped on replay.
+    """
+    global owner_store
+    os.makedirs(directory, exist_ok=True)
+    snapshot_path = os.path.join(directory, 'owners.jsonl')
+    log_path = os.path.join(directory, 'operations.jsonl')
+    reset_owner_index()
+    root = None
+    seq = 0
+
+    if os.path.exists(snapshot_path):
+        nodes = []
+        with open(snapshot_path, mode='r', encoding='utf-8') as f:
+            seq = json.loads(f.readline())['seq']
+            for line in f:
+                owner = json.loads(line)
+                node = create_owner_node(owner['name'])
+                for poke_id in owner['pokedex']:
+                    pokedex_append(node, poke_id)
+                nodes.append(node)
+        root = link_preorder(nodes)
+        index_all_owners(nodes)
+
+    logged = 0
+    if os.path.exists(log_path):
+        with open(log_path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # Half-written last line (crash while saving) => ignore it
+                operation = json.loads(line)
+                if operation['seq'] <= seq:
+                    continue
+                root = apply_operation(root, operation)
+                seq = operation['seq']
+                logged += 1
+
+    owner_store = {'directory': directory, 'seq': seq, 'logged': logged,
+                   'log': open(log_path, mode='a', encoding='utf-8')}
+    return root
+
+
+def link_preorder(nodes):
+    """
+    Link nodes listed in BST pre-order back into that exact tree and return its root.
+    A BST's pre-order fixes its shape, so this is O(n) with a stack and never
+    rotates: a balanced tree comes back with the same shape it was saved with.
+    """
+    root = None
+    # Nodes that may still get a right child, keys decreasing from the bottom
+    stack = []
+    for node in nodes:
+        key = node['name'].lower()
+        node['left'] = node['right'] = None
+        parent = None
+        while stack and stack[-1]['name'].lower() < key:
+            parent = stack.pop()
+        if parent is not None:
+            parent['right'] = node
+        elif stack:
+            stack[-1]['left'] = node
+        else:
+            root = node
+        stack.append(node)
+    for node in iter_postorder(root):
+        update_height(node)
+    return root
+
+
+def apply_operation(root, operation):
+    """
+    Re-do one logged operation on the tree. Return the updated root.
+    """
+    op = operation['op']
+    if op == 'create':
+        return insert_owner_bst(root, create_owner_node(operation['owner'], operation['id']))
+    if op == 'delete':
+        return delete_owner_bst(root, operation['owner'])
+    node = find_owner(root, operation['owner'])
+    if op == 'add':
+        pokedex_add(node, species()['by id'][operation['id']])
+    elif op == 'release':
+        pokedex_remove(node, operation['id'])
+    elif op == 'evolve':
+        pokedex_remove(node, operation['id'])
+        evolution_id = species()['evolutions'][operation['id']]
+        if not pokedex_has(node, evolution_id):
+            pokedex_add(node, species()['by id'][evolution_id])
+    return root
+
+
+def log_operation(op, owner_name, poke_id=None):
+    """
+    Append one operation to the store's log (if a store is open). O(1) per change.
+    """
+    if owner_store is None:
+        return
+    owner_store['seq'] += 1
+    operation = {'seq': owner_store['seq'], 'op': op, 'owner': owner_name}
+    if poke_id is not None:
+        operation['id'] = poke_id
+    owner_store['log'].write(json.dumps(operation) + '\n')
+    owner_store['log'].flush()
+    owner_store['logged'] += 1
+
+
+def save_owner_snapshot(root):
+    """
+    Write a fresh snapshot of the whole tree and empty the operation log.
+    """
+    if owner_store is None:
+        return
+    directory = owner_store['directory']
+    snapshot_path = os.path.join(directory, 'owners.jsonl')
+    temp_path = snapshot_path + '.tmp'
+    with open(temp_path, mode='w', encoding='utf-8') as f:
+        f.write(json.dumps({'seq': owner_store['seq']}) + '\n')
+        for node in iter_preorder(root):
+            f.write(json.dumps({'name': node['name'], 'pokedex': list(node['pokedex'])}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    # The snapshot only becomes visible once it's complete
+    os.replace(temp_path, snapshot_path)
+    owner_store['log'].close()
+    owner_store['log'] = open(os.path.join(directory, 'operations.jsonl'), mode='w', encoding='utf-8')
+    owner_store['logged'] = 0
+
+
+def maybe_compact_owner_store(root):
+    """
+    Rewrite the snapshot once the log has grown past SNAPSHOT_EVERY entries.
+    """
+    if owner_store is not None and owner_store['logged'] >= SNAPSHOT_EVERY:
+        save_owner_snapshot(root)
+
+
+def close_owner_store(root, save=True):
+    """
+    Save a final snapshot and stop persisting. With save=False (e.g. after an
+    interrupted session, whose tree may be stale or half-way through a change) only
+    the log is synced and closed; the next open_owner_store replays it.
+    """
+    global owner_store
+    if owner_store is None:
+        return
+    if save:
+        save_owner_snapshot(root)
+    else:
+        owner_store['log'].flush()
+        os.fsync(owner_store['log'].fileno())
+    owner_store['log'].close()
+    owner_store = None
+
+
+########################
+# 9) Bulk Import / Export
+########################
+
+def iter_owner_rows(filename):
+    """
+    Stream (owner name, [Pokemon IDs]) pairs from a roster file:
+      .jsonl: one {"name": ..., "pokedex": [IDs]} object per line
+      .csv:   a "Name,Pokedex" header, then rows like "Ash,1;5;3"
+    """
+    if filename.endswith('.jsonl'):
+        with open(filename, mode='r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    owner = json.loads(line)
+                    yield owner['name'], [int(poke_id) for poke_id in owner['pokedex']]
+                except (ValueError, KeyError, TypeError) as e:
+                    raise ValueError(f"{filename}, line {line_number}: {e}") from None
+    else:
+        with open(filename, mode='r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter=',')
+            for row in reader:
+                if reader.line_num == 1 or not row:
+                    continue  # header / blank row
+                try:
+                    yield row[0], [int(poke_id) for poke_id in row[1].split(';') if poke_id]
+                except (ValueError, IndexError) as e:
+                    raise ValueError(f"{filename}, line {reader.line_num}: {e}") from None
+
+
+def build_owner_tree(nodes, start=0, end=None):
+    """
+    Link nodes (sorted by lower-cased name, no duplicates) into a height-balanced
+    BST in O(n). Return its root.
+    """
+    if end is None:
+        end = len(nodes)
+    if start >= end:
+        return None
+    middle = (start + end) // 2
+    node = nodes[middle]
+    node['left'] = build_owner_tree(nodes, start, middle)
+    node['right'] = build_owner_tree(nodes, middle + 1, end)
+    update_height(node)
+    return node
+
+
+def import_owners(root, filename):
+    """
+    Add every owner of a roster file (see iter_owner_rows) to the tree. Return the new root.
+    Owners that already exist (or repeat in the file) keep their first pokedex.
+    The file is read in one pass; if it's already sorted by name nothing is sorted,
+    and existing owners are merged in order, so the whole tree is rebuilt balanced
+    in O(n) instead of n separate inserts.
+    """
+    by_id = species()['by id']
+    new_nodes = []
+    for name, pokedex in iter_owner_rows(filename):
+        node = create_owner_node(name)
+        for poke_id in pokedex:
+            if poke_id not in by_id:
+                raise ValueError(f"{filename}: owner '{name}' has unknown Pokemon ID {poke_id}")
+            if not pokedex_has(node, poke_id):
+                pokedex_append(node, poke_id)
+        new_nodes.append(node)
+
+    def owner_key(node):
+        return node['name'].lower()
+
+    if any(owner_key(a) > owner_key(b) for a, b in zip(new_nodes, new_nodes[1:])):
+        new_nodes.sort(key=owner_key)  # stable, so the first of any duplicates stays first
+
+    existing_nodes = iter_inorder(root)
+    if COPY_ON_WRITE_TREE:
+        # build_owner_tree relinks every node, so leave the published ones alone
+        existing_nodes = map(dict, existing_nodes)
+    nodes = []
+    last_key = None
+    # Existing owners come first among equal names, so they win over the file
+    for node in merge(existing_nodes, new_nodes, key=owner_key):
+        key = owner_key(node)
+        if key != last_key:
+            nodes.append(node)
+            last_key = key
+
+    root = build_owner_tree(nodes)
+    index_all_owners(nodes)
+    publish_owner_root(root)
+    # The log can't describe a bulk load, so start a new snapshot from here
+    save_owner_snapshot(root)
+    return root
+
+
+def index_all_owners(nodes):
+    """
+    Rebuild owner_index, owner_ranking and species_owners (the enabled ones) for
+    exactly these nodes, in one go rather than an insert each.
+    """
+    reset_owner_index(owner_index is not None)
+    if owner_index is not None:
+        owner_index.update((node['name'].lower(), node) for node in nodes)
+    if owner_ranking is not None:
+        owner_ranking.extend(sorted((len(node['pokedex']), node['name'].lower()) for node in nodes))
+    if species_owners is not None:
+        for node in nodes:
+            for poke_id in node['pokedex']:
+                add_species_owner(node, poke_id)
+
+
+def export_owners(root, filename):
+    """
+    Write every owner, in name order, to a roster file (.jsonl or .csv, see
+    iter_owner_rows). Streams the tree; return the number of owners written.
+    """
+    count = 0
+    with open(filename, mode='w', encoding='utf-8', newline='') as f:
+        if filename.endswith('.jsonl'):
+            for node in iter_inorder(root):
+                f.write(json.dumps({'name': node['name'], 'pokedex': list(node['pokedex'])}) + '\n')
+                count += 1
+        else:
+            writer = csv.writer(f, delimiter=',')
+            writer.writerow(['Name', 'Pokedex'])
+            for node in iter_inorder(root):
+                writer.writerow([node['name'], ';'.join(map(str, node['pokedex']))])
+                count += 1
+    return count
+
+
+########################
+# 10) Batch Commands
+########################
+
+BATCH_COMMANDS = """Batch commands (one per line, '#' starts a comment, quote names with spaces):
+  create <owner> <starter ID>
+  add <owner> <Pokemon ID>
+  release <owner> <Pokemon name>
+  evolve <owner> <Pokemon name>
+  delete <owner>
+  query <owner> [type=<type>] [evolvable=yes|no] [attack><n>] [hp><n>] [prefix=<letters>]
+  sort
+  print [bfs|pre|in|post]
+  report sizes|types|top <k>|popular [<k>]|with <Pokemon ID>...|alongside <Pokemon ID>
+  owners [prefix=<letters>] [from=<name>] [to=<name>] [limit=<n>] [after=<name>]
+  metrics"""
+TRAVERSALS = {'bfs': iter_bfs, 'pre': iter_preorder, 'in': iter_inorder, 'post': iter_postorder}
+
+
+def split_batch_line(line):
+    """
+    Split one batch command line into words: '#' starts a comment, and quotes keep
+    a name with spaces in one word. Unbalanced quotes raise ValueError.
+    """
+    if '"' in line or "'" in line:
+        return shlex.split(line, comments=True)
+    # Nothing for shlex to do but drop the comment
+    return line.partition('#')[0].split()
+
+
+def parse_query_criteria(words):
+    """
+    Turn query words like 'type=water' or 'attack>50' into filter_pokedex keyword arguments.
+    """
+    criteria = {}
+    for word in words:
+        if word.startswith('type='):
+            criteria['pokemon_type'] = word[len('type='):]
+        elif word.startswith('evolvable='):
+            criteria['evolvable'] = word[len('evolvable='):].lower() in ('yes', 'true', '1')
+        elif word.startswith('attack>'):
+            criteria['attack_above'] = int(word[len('attack>'):])
+        elif word.startswith('hp>'):
+            criteria['hp_above'] = int(word[len('hp>'):])
+        elif word.startswith('prefix='):
+            criteria['name_prefix'] = word[len('prefix='):]
+        else:
+            raise ValueError(f"unknown query criterion '{word}'")
+    return criteria
+
+
+def run_report_command(root, args, sink):
+    """
+    Write one whole-tree report (see section 5b) to sink.
+    """
+    name = args[0].lower() if args else ''
+    if name == 'sizes' and len(args) == 1:
+        sink_extend(sink, [f"{size} Pokemon: {count} owners"
+                           for size, count in pokedex_size_histogram(root).items()])
+    elif name == 'types' and len(args) == 1:
+        sink_extend(sink, [f"{pokemon_type}: {count}" for pokemon_type, count in type_distribution(root).items()])
+    elif name == 'top' and len(args) == 2:
+        sink_extend(sink, [f"Owner: {owner['name']} (has {len(owner['pokedex'])} Pokemon)"
+                           for owner in largest_owners(root, int(args[1]))])
+    elif name == 'popular' and len(args) <= 2:
+        sink_extend(sink, [f"{pokemon['Name']} (ID {pokemon['ID']}): {count} owners"
+                           for pokemon, count in species_popularity(root, int(args[1]) if len(args) == 2 else None)])
+    elif name == 'with' and len(args) >= 2:
+        sink_extend(sink, [f"Owner: {owner['name']}" for owner in owners_of_species(root, *map(int, args[1:]))])
+    elif name == 'alongside' and len(args) == 2:
+        sink_extend(sink, [f"{pokemon['Name']} (ID {pokemon['ID']}): {count} owners"
+                           for pokemon, count in co_owned_species(root, int(args[1]))])
+    else:
+        raise ValueError("usage: report sizes|types|top <k>|popular [<k>]|with <Pokemon ID>...|alongside <Pokemon ID>")
+
+
+def parse_owners_options(args):
+    """
+    Turn 'owners' command words like 'prefix=ash' or 'limit=10' into owners_page
+    keyword arguments. Bad options raise ValueError.
+    """
+    names = {'prefix': 'prefix', 'from': 'low', 'to': 'high', 'limit': 'limit', 'after': 'after'}
+    options = {'limit': 50}
+    for word in args:
+        key, sep, value = word.partition('=')
+        if not sep or key not in names:
+            raise ValueError(f"unknown owners option '{word}'")
+        if key == 'limit' and not value.lstrip('-').isdecimal():
+            raise ValueError(f"limit must be a number, not '{value}'")
+        options[names[key]] = int(value) if key == 'limit' else value
+    if options['limit'] < 1:
+        raise ValueError("limit must be at least 1")
+    return options
+
+
+def run_owners_command(root, args, sink):
+    """
+    Write one page of owner names (see owners_page) to sink,
+    then 'next: <name>' if there are more (pass it back as after=<name>).
+    """
+    page, cursor = owners_page(root, **parse_owners_options(args))
+    sink_extend(sink, [f"Owner: {owner['name']} (has {len(owner['pokedex'])} Pokemon)" for owner in page])
+    if cursor is not None:
+        sink_write(sink, f"next: {cursor}")
+
+
+def run_batch_command(root, words, sink):
+    """
+    Run one parsed batch command, writing its result lines to sink.
+    Return the updated root. Bad commands raise ValueError.
+    """
+    command, args = words[0].lower(), words[1:]
+    if command in ('create', 'add', 'release', 'evolve') and len(args) != 2:
+        raise ValueError(f"usage: {command} <owner> <{'ID' if command in ('create', 'add') else 'name'}>")
+    if command == 'create':
+        root, node = create_owner(root, args[0], int(args[1]))
+        if node is None:
+            sink_write(sink, f"Owner '{args[0]}' already exists.")
+        else:
+            sink_write(sink, f"Created {args[0]}.")
+        return root
+    if command == 'delete':
+        if len(args) != 1:
+            raise ValueError("usage: delete <owner>")
+        root, node = remove_owner(root, args[0])
+        sink_write(sink, f"Deleted {args[0]}." if node else f"Owner '{args[0]}' not found.")
+        return root
+    if command == 'sort':
+        sink_extend(sink, [f"Owner: {owner['name']} (has {len(owner['pokedex'])} Pokemon)"
+                           for owner in owners_by_num_pokemon(root)])
+        return root
+    if command == 'print':
+        order = args[0].lower() if args else 'in'
+        if order not in TRAVERSALS:
+            raise ValueError(f"unknown traversal '{order}'")
+        write_owners(TRAVERSALS[order](root), sink)
+        return root
+    if command == 'report':
+        run_report_command(root, args, sink)
+        return root
+    if command == 'metrics':
+        sink_extend(sink, format_metrics(root))
+        return root
+    if command == 'owners':
+        run_owners_command(root, args, sink)
+        return root
+    if command not in ('add', 'release', 'evolve', 'query'):
+        raise ValueError(f"unknown command '{command}'")
+
+    if not args:
+        raise ValueError(f"usage: {command} <owner> ...")
+    node = find_owner(root, args[0])
+    if node is None:
+        sink_write(sink, f"Owner '{args[0]}' not found.")
+    elif command == 'add':
+        status, pokemon = add_pokemon(node, int(args[1]))
+        sink_write(sink, f"{status}: {args[1]}" if pokemon is None else f"{status}: {pokemon['Name']}")
+    elif command == 'release':
+        pokemon = release_pokemon(node, args[1])
+        sink_write(sink, f"released: {pokemon['Name']}" if pokemon else f"not found: {args[1]}")
+    elif command == 'evolve':
+        status, pokemon, evolved_pokemon = evolve_pokemon(node, args[1])
+        if evolved_pokemon is None:
+            sink_write(sink, f"{status}: {args[1]}")
+        else:
+            sink_write(sink, f"{status}: {pokemon['Name']} -> {evolved_pokemon['Name']}")
+    else:
+        display_pokemon_list(filter_pokedex(node, **parse_query_criteria(args[1:])), sink)
+    # With COPY_ON_WRITE_TREE a pokedex change publishes a new owner_root
+    return owner_root if COPY_ON_WRITE_TREE else root
+
+
+def run_batch(root, lines, sink=None):
+    """
+    Run batch commands (see BATCH_COMMANDS) from an iterable of lines, e.g. an open file
+    or sys.stdin. Results go to sink (default: stdout), which writes them in chunks
+    instead of one print per result.
+    Errors are reported per line and don't stop the run. Return the updated root.
+    """
+    if sink is None:
+        sink = make_output_sink()
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            words = split_batch_line(line)
+            if words:
+                root = run_batch_command(root, words, sink)
+        except ValueError as e:
+            sink_write(sink, f"error: line {line_number}: {e}")
+        maybe_compact_owner_store(root)
+    flush_output_sink(sink)
+    return root
+
+
+########################
+# 10b) Instrumentation
+########################
+# enable_metrics() swaps the functions below for wrappers that count calls, time
+# them into a histogram and, for the BST searches, count the nodes visited. Off
+# (the default), the plain functions run and nothing is measured, so it costs nothing.
+
+INSTRUMENTED_FUNCTIONS = (
+    'insert_owner_bst', 'find_owner_bst', 'delete_owner_bst', 'find_owner',
+    'pokedex_add', 'pokedex_remove', 'filter_pokedex',
+    'add_pokemon', 'release_pokemon', 'evolve_pokemon',
+    'owners_by_num_pokemon', 'write_owners', 'run_batch_command',
+)
+# Functions whose second argument is an owner name (or node) to search the tree for
+SEARCH_FUNCTIONS = ('insert_owner_bst', 'find_owner_bst', 'delete_owner_bst')
+# Upper bounds (seconds) of the timing histogram buckets
+METRIC_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+
+
+def search_path_length(root, owner_name):
+    """
+    Return how many nodes a search for owner_name visits.
+    """
+    owner_name = owner_name.lower()
+    visited = 0
+    current_root = root
+    while current_root is not None:
+        visited += 1
+        current_name = current_root['name'].lower()
+        if owner_name == current_name:
+            break
+        current_root = current_root['left'] if owner_name < current_name else current_root['right']
+    return visited
+
+
+def instrument(name, func):
+    """
+    Return a wrapper of func that records its calls in metrics under `name`.
+    Calls it makes to itself (recursion) are counted as part of the outer call;
+    calls from other threads are counted on their own.
+    """
+    stats = {'calls': 0, 'seconds': 0.0, 'buckets': [0] * (len(METRIC_BUCKETS) + 1), 'visited': 0}
+    metrics['functions'][name] = stats
+    lock = metrics['lock']
+    # .active is set while this thread is inside func
+    running = threading.local()
+
+    def wrapper(*args, **kwargs):
+        if getattr(running, 'active', False):
+            return func(*args, **kwargs)
+        visited = 0
+        if name in SEARCH_FUNCTIONS:
+            target = args[1]['name'] if isinstance(args[1], dict) else args[1]
+            visited = search_path_length(args[0], target)
+        running.active = True
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            running.active = False
+            with lock:
+                stats['calls'] += 1
+                stats['seconds'] += elapsed
+                stats['buckets'][bisect_left(METRIC_BUCKETS, elapsed)] += 1
+                stats['visited'] += visited
+
+    wrapper.__wrapped__ = func
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def enable_metrics():
+    """
+    Start recording metrics for INSTRUMENTED_FUNCTIONS (from zero).
+    """
+    global metrics
+    disable_metrics()
+    metrics = {'functions': {}, 'started': time.time(), 'lock': threading.Lock()}
+    module = globals()
+    for name in INSTRUMENTED_FUNCTIONS:
+        module[name] = instrument(name, module[name])
+
+
+def disable_metrics():
+    """
+    Put the plain functions back and drop the recorded metrics.
+    """
+    global metrics
+    if metrics is None:
+        return
+    module = globals()
+    for name in metrics['functions']:
+        module[name] = module[name].__wrapped__
+    metrics = None
+
+
+def format_metrics(root):
+    """
+    Return the metrics as lines of the Prometheus text format: per-function call
+    counters, timing histograms and visited-node counters, plus gauges of the
+    tree's size and height. Those are kept up to date by the tree operations (see
+    indexes_cover and node_height); only a tree the indexes don't cover is counted.
+    """
+    owners = len(owner_index) if indexes_cover(root) else sum(1 for _ in iter_preorder(root))
+    lines = ['# HELP pokedex_owners Owners in the tree.', '# TYPE pokedex_owners gauge',
+             f'pokedex_owners {owners}',
+             '# HELP pokedex_tree_height Nodes on the longest root-to-leaf path of the owner tree.',
+             '# TYPE pokedex_tree_height gauge',
+             f'pokedex_tree_height {node_height(root)}']
+    if metrics is None:
+        return lines
+    # A consistent copy, as other threads may be recording calls
+    with metrics['lock']:
+        functions = {name: dict(stats, buckets=stats['buckets'][:]) for name, stats in metrics['functions'].items()}
+    lines += ['# HELP pokedex_calls_total Calls per function.', '# TYPE pokedex_calls_total counter']
+    lines += [f'pokedex_calls_total{{function="{name}"}} {stats["calls"]}' for name, stats in functions.items()]
+    lines += ['# HELP pokedex_visited_nodes_total Owner tree nodes visited by searches.',
+              '# TYPE pokedex_visited_nodes_total counter']
+    lines += [f'pokedex_visited_nodes_total{{function="{name}"}} {functions[name]["visited"]}'
+              for name in SEARCH_FUNCTIONS if name in functions]
+    lines += ['# HELP pokedex_call_seconds Time per call.', '# TYPE pokedex_call_seconds histogram']
+    for name, stats in functions.items():
+        cumulative = 0
+        for bound, count in zip(METRIC_BUCKETS + ('+Inf',), stats['buckets']):
+            cumulative += count
+            lines.append(f'pokedex_call_seconds_bucket{{function="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'pokedex_call_seconds_sum{{function="{name}"}} {stats["seconds"]:.9f}')
+        lines.append(f'pokedex_call_seconds_count{{function="{name}"}} {stats["calls"]}')
+    return lines
+
+
+def write_metrics(root, filename):
+    """
+    Write format_metrics() to filename. The file is replaced in one step, so a
+    scraper reading it never sees half of it.
+    """
+    temp_path = filename + '.tmp'
+    with open(temp_path, mode='w', encoding='utf-8') as f:
+        f.write('\n'.join(format_metrics(root)) + '\n')
+    os.replace(temp_path, filename)
+
+
+def start_profile():
+    """
+    Start profiling the session: cProfile for time, tracemalloc for memory.
+    Return the profiler, for stop_profile().
+    """
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler, stream=None, limit=20):
+    """
+    Stop profiling and write a summary to stream (default stderr): the functions
+    with the most cumulative time and the lines that allocated the most memory
+    still in use, plus the peak.
+    """
+    profiler.disable()
+    stream = stream or sys.stderr
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("=== Profile: cumulative time ===", file=stream)
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    print(f"=== Memory: {current / 1024:.1f} KiB in use, peak {peak / 1024:.1f} KiB ===", file=stream)
+    for stat in snapshot.statistics('lineno')[:limit]:
+        print(stat, file=stream)
+
+
+########################
+# 11) Sub-menu & Main menu
 ########################
 
 def create_pokedex(owner_root):
     name = input("Owner name: ")
     print(STARTER_MENU)
-    if find_owner_bst(owner_root, name.lower()):
+    if find_owner(owner_root, name):
         print(f"Owner '{name}' already exists. No new Pokedex created.")
-        return
+        return owner_root
 
     starter_choice = input("Your choice: ")
     while starter_choice not in ['1', '2', '3']:
@@ -612,10 +2743,10 @@ def create_pokedex(owner_root):
     # Convert input to index and multiply by 3 to find the correct starter
     starter_choice = (starter_choice - 1) * 3
 
-    new_node = create_owner_node(name, starter_choice + 1)  # Convert from index back to id
-    owner_root = insert_owner_bst(owner_root, new_node)
+    # Convert from index back to id
+    owner_root, new_node = create_owner(owner_root, name, starter_choice + 1)
 
-    starter_name = new_node['pokedex'][0]['Name']
+    starter_name = species()['by id'][starter_choice + 1]['Name']
     print('New Pokedex created for {} with starter {}.'.format(new_node['name'], starter_name))
     return owner_root
 
@@ -631,8 +2762,7 @@ def existing_pokedex():
     """
     global owner_root
     name = input("Owner name: ")
-    lower_name = name.lower()
-    node = find_owner_bst(owner_root, lower_name)
+    node = find_owner(owner_root, name)
     if not node:
         print(f"Owner '{name}' not found.")
         return
@@ -640,6 +2770,8 @@ def existing_pokedex():
 
     choice = -1
     while choice != '5':
+        # With COPY_ON_WRITE_TREE every change replaces the node, so pick up the latest one
+        node = find_owner(owner_root, name)
         print(POKEDEX_MENU.format(node['name']))
         choice = input("Your choice: ")
         while choice not in ['1', '2', '3', '4', '5']:
@@ -707,6 +2839,7 @@ def main_menu():
             break
         else:
             print("Invalid choice.")
+        maybe_compact_owner_store(owner_root)
 
     print("Goodbye!")
 
@@ -715,7 +2848,65 @@ def main():
     """
     Entry point: calls main_menu().
     """
-    main_menu()
+    global BALANCED_OWNER_TREE, COPY_ON_WRITE_TREE, owner_root
+    parser = argparse.ArgumentParser(description="Hoenn Pokedex manager", epilog=BATCH_COMMANDS,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--balanced", action="store_true",
+                        help="keep the owner BST height-balanced (AVL)")
+    parser.add_argument("--copy-on-write", action="store_true",
+                        help="never change a published tree node, so readers can use snapshots")
+    parser.add_argument("--store", metavar="DIR",
+                        help="load the owners from DIR and save every change back to it")
+    parser.add_argument("--import-owners", metavar="FILE",
+                        help="add the owners of a .jsonl/.csv roster before starting")
+    parser.add_argument("--export-owners", metavar="FILE",
+                        help="write all owners to a .jsonl/.csv roster on exit")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run the commands in FILE ('-' for stdin) instead of the menu")
+    parser.add_argument("--output", metavar="FILE", default="stdout",
+                        help="where --batch writes its results: a file, 'stdout' or 'null'")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record call counts and timings, and write them to FILE on exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the session (cProfile + tracemalloc); summary goes to stderr")
+    args = parser.parse_args()
+    if args.metrics:
+        enable_metrics()
+    profiler = start_profile() if args.profile else None
+    BALANCED_OWNER_TREE = args.balanced
+    COPY_ON_WRITE_TREE = args.copy_on_write
+    finished = False
+    try:
+        if args.store:
+            owner_root = open_owner_store(args.store)
+        if args.import_owners:
+            owner_root = import_owners(owner_root, args.import_owners)
+        if args.batch:
+            sink = make_output_sink(args.output)
+            try:
+                if args.batch == '-':
+                    owner_root = run_batch(owner_root, sys.stdin, sink)
+                else:
+                    with open(args.batch, mode='r', encoding='utf-8') as f:
+                        owner_root = run_batch(owner_root, f, sink)
+            finally:
+                close_output_sink(sink)
+        else:
+            main_menu()
+        if args.export_owners:
+            export_owners(owner_root, args.export_owners)
+        finished = True
+    except (EOFError, KeyboardInterrupt):
+        # Input ran out or Ctrl-C: wind down like Exit, minus the final snapshot
+        print("\nGoodbye!")
+    finally:
+        # Only a session that finished has a tree worth snapshotting
+        close_owner_store(owner_root, save=finished)
+        close_report_pool()
+        if profiler is not None:
+            stop_profile(profiler)
+        if args.metrics:
+            write_metrics(owner_root, args.metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,512 @@
+# pokedex_bench.py
+
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import ex7
+
+
+def make_owner_names(count):
+    """
+    Return `count` owner names in sorted order (the worst case for a plain BST).
+    """
+    return [f"owner{i:07d}" for i in range(count)]
+
+
+def build_owner_tree(names, balanced):
+    """
+    Insert every name into a fresh owner BST. Return (root, seconds).
+    """
+    ex7.BALANCED_OWNER_TREE = balanced
+    ex7.reset_owner_index()
+    root = None
+    start = time.perf_counter()
+    for name in names:
+        root = ex7.insert_owner_bst(root, ex7.create_owner_node(name, 1))
+    return root, time.perf_counter() - start
+
+
+def bench_sorted_insert(sizes=(500, 1000, 2000, 4000), balanced_sizes=(10000, 100000)):
+    """
+    Time inserting sorted names. The plain BST's per-insert cost grows linearly
+    with n; the AVL tree's stays logarithmic.
+    """
+    print("=== Sorted-input insert ===")
+    print(f"{'mode':<10}{'owners':>10}{'total (s)':>12}{'per insert (us)':>18}{'height':>8}")
+    for balanced in (False, True):
+        mode = "balanced" if balanced else "plain"
+        mode_sizes = sizes + balanced_sizes if balanced else sizes
+        for count in mode_sizes:
+            root, seconds = build_owner_tree(make_owner_names(count), balanced)
+            height = ex7.node_height(root)
+            print(f"{mode:<10}{count:>10}{seconds:>12.4f}{seconds / count * 1e6:>18.2f}{height:>8}")
+    ex7.BALANCED_OWNER_TREE = False
+
+
+def make_species(count, seed=7):
+    """
+    Return `count` synthetic species dicts in the HOENN_DATA format.
+    """
+    rng = random.Random(seed)
+    types = sorted({pokemon['Type'] for pokemon in ex7.HOENN_DATA})
+    return [{"ID": i, "Name": f"Mon{rng.randrange(36 ** 4):05x}{i}", "Type": rng.choice(types),
+             "HP": rng.randrange(1, 200), "Attack": rng.randrange(1, 200),
+             "Can Evolve": rng.choice(("TRUE", "FALSE"))}
+            for i in range(1, count + 1)]
+
+
+def legacy_filter(owner_node, criterion, value):
+    """
+    The per-Pokemon loops display_filter_sub_menu used before filter_pokedex.
+    """
+    pokemon_list = []
+    for pokemon in ex7.pokedex_pokemon(owner_node):
+        if criterion == 'type' and pokemon['Type'].lower() == value.lower():
+            pokemon_list.append(pokemon)
+        elif criterion == 'evolvable' and pokemon['Can Evolve'] == 'TRUE':
+            pokemon_list.append(pokemon)
+        elif criterion == 'attack' and pokemon['Attack'] > value:
+            pokemon_list.append(pokemon)
+        elif criterion == 'hp' and pokemon['HP'] > value:
+            pokemon_list.append(pokemon)
+        elif criterion == 'prefix' and pokemon['Name'].lower().startswith(value.lower()):
+            pokemon_list.append(pokemon)
+    return pokemon_list
+
+
+def best_of(repeats, func, *args, **kwargs):
+    """
+    Return (best wall time in seconds, result) of calling func `repeats` times.
+    """
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_filters(size=100000, repeats=5):
+    """
+    Compare filter_pokedex against the old loops on one owner with a `size`-entry pokedex.
+    """
+    original = ex7.HOENN_DATA
+    species = make_species(size)
+    ex7.load_species(species)
+    owner = ex7.create_owner_node("bench", 1)
+    for pokemon in species[1:]:
+        ex7.pokedex_add(owner, pokemon)
+
+    cases = [
+        ("type", "water", {"pokemon_type": "water"}),
+        ("evolvable", True, {"evolvable": True}),
+        ("attack", 100, {"attack_above": 100}),
+        ("hp", 100, {"hp_above": 100}),
+        ("prefix", "mon1", {"name_prefix": "mon1"}),
+    ]
+    print(f"=== Filters on a {size}-entry pokedex (best of {repeats}) ===")
+    print(f"{'filter':<12}{'loops (ms)':>12}{'engine (ms)':>13}{'speedup':>9}{'matches':>9}")
+    for criterion, value, criteria in cases:
+        legacy_time, legacy_result = best_of(repeats, legacy_filter, owner, criterion, value)
+        engine_time, engine_result = best_of(repeats, ex7.filter_pokedex, owner, **criteria)
+        assert legacy_result == engine_result
+        print(f"{criterion:<12}{legacy_time * 1e3:>12.2f}{engine_time * 1e3:>13.2f}"
+              f"{legacy_time / engine_time:>8.1f}x{len(engine_result):>9}")
+    ex7.load_species(original)
+
+
+def write_roster(filename, count, pokedex_size=6, seed=11):
+    """
+    Write a sorted .jsonl roster of `count` owners with random pokedexes.
+    """
+    rng = random.Random(seed)
+    ids = [pokemon['ID'] for pokemon in ex7.HOENN_DATA]
+    with open(filename, mode='w', encoding='utf-8') as f:
+        for name in make_owner_names(count):
+            f.write(json.dumps({'name': name, 'pokedex': rng.sample(ids, pokedex_size)}) + '\n')
+
+
+def bench_bulk_import(sizes=(10000, 100000, 300000)):
+    """
+    Time import_owners / export_owners against inserting the same owners one by one.
+    """
+    print("=== Bulk roster import / export ===")
+    print(f"{'owners':>10}{'import (s)':>12}{'owners/s':>12}{'export (s)':>12}{'owners/s':>12}{'inserts (s)':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        roster = os.path.join(directory, 'roster.jsonl')
+        exported = os.path.join(directory, 'exported.jsonl')
+        for count in sizes:
+            write_roster(roster, count)
+
+            ex7.reset_owner_index()
+            start = time.perf_counter()
+            root = ex7.import_owners(None, roster)
+            import_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            ex7.export_owners(root, exported)
+            export_time = time.perf_counter() - start
+
+            # The same owners, one insert_owner_bst call (+ pokedex_add calls) each
+            ex7.BALANCED_OWNER_TREE = True
+            ex7.reset_owner_index()
+            start = time.perf_counter()
+            root = None
+            for name, pokedex in ex7.iter_owner_rows(roster):
+                node = ex7.create_owner_node(name)
+                for poke_id in pokedex:
+                    ex7.pokedex_add(node, ex7.HOENN_BY_ID[poke_id])
+                root = ex7.insert_owner_bst(root, node)
+            insert_time = time.perf_counter() - start
+            ex7.BALANCED_OWNER_TREE = False
+
+            print(f"{count:>10}{import_time:>12.3f}{count / import_time:>12.0f}"
+                  f"{export_time:>12.3f}{count / export_time:>12.0f}{insert_time:>13.3f}")
+    ex7.reset_owner_index()
+
+
+def bench_print_all(count=100000):
+    """
+    Time Print All (in-order) of `count` owners: one print() per line vs. a chunked
+    file sink vs. the null sink (traversal + formatting only).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        roster = os.path.join(directory, 'roster.jsonl')
+        write_roster(roster, count)
+        ex7.reset_owner_index()
+        root = ex7.import_owners(None, roster)
+
+        dump = os.path.join(directory, 'dump.txt')
+        with open(dump, mode='w', encoding='utf-8') as f:
+            start = time.perf_counter()
+            for owner in ex7.iter_inorder(root):
+                print(file=f)
+                print(f'Owner: {owner["name"]}', file=f)
+                for pokemon in ex7.pokedex_pokemon(owner):
+                    print(ex7.format_pokemon(pokemon), file=f)
+            print_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sink = ex7.make_output_sink(dump)
+        ex7.in_order(root, sink)
+        ex7.close_output_sink(sink)
+        file_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ex7.in_order(root, ex7.make_output_sink('null'))
+        null_time = time.perf_counter() - start
+    ex7.reset_owner_index()
+
+    print(f"=== Print All of {count} owners ===")
+    print(f"{'print() per line (s)':>22}{'file sink (s)':>15}{'null sink (s)':>15}")
+    print(f"{print_time:>22.3f}{file_time:>15.3f}{null_time:>15.3f}")
+
+
+########################
+# Benchmark suite (JSON)
+########################
+# `python pokedex_bench.py --suite --json results.json` times every owner-tree and
+# pokedex operation on synthetic data and writes the results as JSON; run it again
+# with `--compare results.json` to see what got slower. Output goes to the null
+# sink, so formatting is measured but the terminal isn't.
+
+NAME_ORDERS = ("sorted", "random", "adversarial")
+TRAVERSAL_FUNCTIONS = ("bfs_traversal", "pre_order", "in_order", "post_order")
+FILTER_CASES = {
+    "type": {"pokemon_type": "water"},
+    "evolvable": {"evolvable": True},
+    "attack": {"attack_above": 100},
+    "hp": {"hp_above": 100},
+    "prefix": {"name_prefix": "mon1"},
+    "all": {},
+}
+
+
+def order_owner_names(names, order, seed):
+    """
+    Return the sorted `names` in insertion order `order`:
+      sorted:      as is (a plain BST degrades into a right-leaning list)
+      random:      shuffled
+      adversarial: alternating smallest/largest, a zig-zag path of depth n for a
+                   plain BST and a rotation on almost every AVL insert
+    """
+    if order == "sorted":
+        return list(names)
+    if order == "random":
+        shuffled = list(names)
+        random.Random(seed).shuffle(shuffled)
+        return shuffled
+    zigzag = []
+    low, high = 0, len(names) - 1
+    while low <= high:
+        zigzag.append(names[low])
+        if low != high:
+            zigzag.append(names[high])
+        low, high = low + 1, high - 1
+    return zigzag
+
+
+def make_owner_nodes(names, seed):
+    """
+    Return a fresh node per name, each with a small pokedex (1-6 real species).
+    """
+    rng = random.Random(seed)
+    ids = [pokemon['ID'] for pokemon in ex7.HOENN_DATA]
+    nodes = []
+    for name in names:
+        node = ex7.create_owner_node(name)
+        for poke_id in rng.sample(ids, rng.randint(1, 6)):
+            ex7.pokedex_add(node, ex7.HOENN_BY_ID[poke_id])
+        nodes.append(node)
+    return nodes
+
+
+def tree_depth(root):
+    """
+    Return the number of nodes on the longest root-to-leaf path.
+    """
+    depth = 0
+    stack = [(root, 1)] if root is not None else []
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in (node['left'], node['right']) if child is not None)
+    return depth
+
+
+def time_case(results, key, repeats, ops, setup, run):
+    """
+    Time run(setup()) `repeats` times (setup isn't timed) and store the best
+    under results[key] as seconds, operations and microseconds per operation.
+    The garbage collector is off while timing, like timeit, to cut the noise.
+    """
+    best = None
+    for _ in range(repeats):
+        state = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    results[key] = {"seconds": best, "ops": ops, "us per op": best / ops * 1e6 if ops else 0.0}
+
+
+def build_tree(nodes):
+    ex7.reset_owner_index()
+    root = None
+    for node in nodes:
+        node['left'] = node['right'] = None
+        node['height'] = 1
+        root = ex7.insert_owner_bst(root, node)
+    return root
+
+
+def bench_owner_tree(results, owners, repeats, seed):
+    """
+    Time insert / find / delete, the four traversals and the sort for every
+    name order, on a plain and a balanced tree.
+    """
+    names = make_owner_names(owners)
+    null_sink = ex7.make_output_sink('null')
+    for order in NAME_ORDERS:
+        ordered = order_owner_names(names, order, seed)
+        lookups = order_owner_names(names, "random", seed + 1)
+        for mode in ("plain", "balanced"):
+            ex7.BALANCED_OWNER_TREE = mode == "balanced"
+            case = f"{order}/{mode}"
+
+            time_case(results, f"insert_owner_bst/{case}", repeats, owners,
+                      lambda: make_owner_nodes(ordered, seed), build_tree)
+            root = build_tree(make_owner_nodes(ordered, seed))
+            results[f"tree depth/{case}"] = {"depth": tree_depth(root)}
+
+            time_case(results, f"find_owner_bst/{case}", repeats, owners, lambda: root,
+                      lambda tree: [ex7.find_owner_bst(tree, name) for name in lookups])
+            for function in TRAVERSAL_FUNCTIONS:
+                time_case(results, f"{function}/{case}", repeats, owners, lambda: root,
+                          lambda tree, function=function: getattr(ex7, function)(tree, null_sink))
+            time_case(results, f"sort_owners_by_num_pokemon/{case}", repeats, owners, lambda: root,
+                      lambda tree: ex7.sort_owners_by_num_pokemon(tree, null_sink))
+
+            def delete_all(tree):
+                for name in lookups:
+                    tree = ex7.delete_owner_bst(tree, name)
+            time_case(results, f"delete_owner_bst/{case}", repeats, owners,
+                      lambda: build_tree(make_owner_nodes(ordered, seed)), delete_all)
+    ex7.BALANCED_OWNER_TREE = False
+    ex7.reset_owner_index()
+
+
+def bench_filter_cases(results, pokedex_size, repeats):
+    """
+    Time every display_filter_sub_menu filter (filter_pokedex + display to the
+    null sink) on a small real pokedex and on a huge synthetic one.
+    """
+    null_sink = ex7.make_output_sink('null')
+    small = ex7.create_owner_node("small", 1)
+    for poke_id in (4, 7, 25, 41, 63):
+        ex7.pokedex_add(small, ex7.HOENN_BY_ID[poke_id])
+
+    def run_filters(owner, label):
+        for name, criteria in FILTER_CASES.items():
+            time_case(results, f"filter/{name}/{label}", repeats, len(owner['pokedex']), lambda: owner,
+                      lambda node, criteria=criteria: ex7.display_pokemon_list(
+                          ex7.filter_pokedex(node, **criteria), null_sink))
+
+    run_filters(small, "small")
+    original = ex7.HOENN_DATA
+    data = make_species(pokedex_size)
+    ex7.load_species(data)
+    huge = ex7.create_owner_node("huge")
+    for pokemon in data:
+        ex7.pokedex_add(huge, pokemon)
+    run_filters(huge, "huge")
+    ex7.load_species(original)
+
+
+def bench_pokedex_ops(results, pokedex_size, repeats, seed, removes=1000):
+    """
+    Time pokedex_add / pokedex_has / pokedex_remove on a full Hoenn pokedex and
+    on a huge synthetic one. A pokedex holds each species at most once, so the
+    Hoenn case is the largest a real owner gets; pokedex_remove's scan and shift
+    are bounded by it. The huge case removes `removes` random IDs so the
+    O(n) cost per release shows up without timing n of them.
+    """
+    def run_ops(data, label, remove_ids):
+        def fill(owner):
+            for pokemon in data:
+                ex7.pokedex_add(owner, pokemon)
+            return owner
+
+        def full_owner():
+            return fill(ex7.create_owner_node(label))
+
+        def remove_all(owner):
+            for poke_id in remove_ids:
+                ex7.pokedex_remove(owner, poke_id)
+
+        time_case(results, f"pokedex_add/{label}", repeats, len(data),
+                  lambda: ex7.create_owner_node(label), fill)
+        time_case(results, f"pokedex_has/{label}", repeats, len(remove_ids), full_owner,
+                  lambda owner: [ex7.pokedex_has(owner, poke_id) for poke_id in remove_ids])
+        time_case(results, f"pokedex_remove/{label}", repeats, len(remove_ids), full_owner, remove_all)
+
+    hoenn_ids = [pokemon['ID'] for pokemon in ex7.HOENN_DATA]
+    random.Random(seed).shuffle(hoenn_ids)
+    run_ops(ex7.HOENN_DATA, "hoenn", hoenn_ids)
+    original = ex7.HOENN_DATA
+    data = make_species(pokedex_size)
+    ex7.load_species(data)
+    run_ops(data, "huge", random.Random(seed).sample(range(1, pokedex_size + 1), min(removes, pokedex_size)))
+    ex7.load_species(original)
+
+
+def bench_read_csv(results, pokedex_size, repeats):
+    """
+    Time read_hoenn_csv on the real CSV and on a synthetic one of pokedex_size rows.
+    """
+    time_case(results, "read_hoenn_csv/hoenn", repeats, len(ex7.HOENN_DATA),
+              lambda: ex7.HOENN_CSV, ex7.read_hoenn_csv)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'species.csv')
+        with open(filename, mode='w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["ID", "Name", "Type", "HP", "Attack", "Can Evolve"])
+            for pokemon in make_species(pokedex_size):
+                writer.writerow([pokemon[column] for column in
+                                 ("ID", "Name", "Type", "HP", "Attack", "Can Evolve")])
+        time_case(results, "read_hoenn_csv/huge", repeats, pokedex_size, lambda: filename, ex7.read_hoenn_csv)
+
+
+def run_suite(owners=800, pokedex_size=100000, repeats=3, seed=1):
+    """
+    Run the whole suite and return {'meta': run parameters, 'results': name -> timing}.
+    The default owner count keeps the O(n) paths of the degenerate plain trees quick.
+    """
+    results = {}
+    bench_owner_tree(results, owners, repeats, seed)
+    bench_filter_cases(results, pokedex_size, repeats)
+    bench_pokedex_ops(results, pokedex_size, repeats, seed)
+    bench_read_csv(results, pokedex_size, repeats)
+    meta = {"owners": owners, "pokedex size": pokedex_size, "repeats": repeats, "seed": seed,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+
+def compare_results(old, new, tolerance=0.10):
+    """
+    Print each timing of `new` next to the same one in `old`. Return the names of
+    the ones that got more than `tolerance` slower.
+    """
+    slower = []
+    print(f"{'benchmark':<48}{'old (ms)':>11}{'new (ms)':>11}{'ratio':>8}")
+    for name, timing in new["results"].items():
+        before = old["results"].get(name, {})
+        if "seconds" not in timing or "seconds" not in before:
+            continue
+        ratio = timing["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            slower.append(name)
+            flag = "  slower"
+        print(f"{name:<48}{before['seconds'] * 1e3:>11.3f}{timing['seconds'] * 1e3:>11.3f}{ratio:>8.2f}{flag}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pokedex benchmarks")
+    parser.add_argument("--suite", action="store_true",
+                        help="run the JSON benchmark suite instead of the printed reports")
+    parser.add_argument("--json", metavar="FILE", default="-", help="where --suite writes its results")
+    parser.add_argument("--compare", metavar="FILE", help="compare --suite results with an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="slowdown (fraction) --compare reports as a regression")
+    parser.add_argument("--owners", type=int, default=800)
+    parser.add_argument("--pokedex-size", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.suite:
+        bench_sorted_insert()
+        print()
+        bench_filters()
+        print()
+        bench_bulk_import()
+        print()
+        bench_print_all()
+        return 0
+
+    report = run_suite(args.owners, args.pokedex_size, args.repeats, args.seed)
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.json, mode='w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, mode='r', encoding='utf-8') as f:
+            slower = compare_results(json.load(f), report, args.tolerance)
+        if slower:
+            print(f"{len(slower)} benchmark(s) more than {args.tolerance:.0%} slower", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,93 +1,487 @@
-# pokedex_gui.py
-
-import tkinter as tk
-from PIL import Image, ImageTk
-import os
-
-
-def show_Pokedex_GUI(pokeList):
-    """
-    Display each Pokemon in a simple Tkinter window with its Name, Type, HP,
-    Attack, and optionally an image from the 'pokemons' folder.
-    We allow horizontal resizing so each Pokemon 'frame' expands in width.
-    """
-    root = tk.Tk()
-    root.title("My Pokedex GUI")
-
-    # Create a canvas and a vertical scrollbar
-    canvas = tk.Canvas(root)
-    scrollbar = tk.Scrollbar(root, orient="vertical", command=canvas.yview)
-    canvas.configure(yscrollcommand=scrollbar.set)
-
-    # This 'scrollable_frame' is where we'll place each Pokemon frame.
-    scrollable_frame = tk.Frame(canvas)
-
-    # A callback to update the scrollregion whenever 'scrollable_frame' changes size
-    def on_frame_configure(event):
-        canvas.configure(scrollregion=canvas.bbox("all"))
-
-    scrollable_frame.bind("<Configure>", on_frame_configure)
-
-    # Actually place 'scrollable_frame' in the canvas
-    # We'll store the canvas window ID so we can update its width on resize
-    canvas_window = canvas.create_window(
-        (0, 0), window=scrollable_frame, anchor="nw")
-
-    # A callback to keep the scrollable_frame the same width as the canvas
-    def on_canvas_configure(event):
-        # Set the scrollable_frame width to match canvas' width
-        canvas.itemconfig(canvas_window, width=event.width)
-
-    canvas.bind("<Configure>", on_canvas_configure)
-
-    # Mouse wheel handling
-    def on_mouse_wheel(event):
-        # On Windows/macOS: event.delta is typically ±120 per wheel step
-        canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-
-    canvas.bind_all("<MouseWheel>", on_mouse_wheel)  # Windows/macOS
-    # For Linux (buttons 4=up, 5=down):
-    canvas.bind_all("<Button-4>", lambda e: canvas.yview_scroll(-1, "units"))
-    canvas.bind_all("<Button-5>", lambda e: canvas.yview_scroll(1, "units"))
-
-    # Pack the canvas and scrollbar
-    canvas.pack(side="left", fill="both", expand=True)
-    scrollbar.pack(side="right", fill="y")
-
-    if not pokeList:
-        msg = tk.Label(scrollable_frame, text="No Pokemon in this Pokedex!")
-        msg.pack(padx=10, pady=10)
-    else:
-        for poke in pokeList:
-            # Create a frame for each Pokémon, fill horizontally, expand so it can grow
-            frame = tk.Frame(scrollable_frame, bd=2,
-                             relief='groove', padx=5, pady=5)
-            frame.pack(side="top", fill="x", expand=True, padx=10, pady=5)
-
-            # Pokemon text info
-            info = (
-                f"ID: {poke['ID']} | "
-                f"Name: {poke['Name']} | "
-                f"Type: {poke['Type']} | "
-                f"HP: {poke['HP']} | "
-                f"Attack: {poke['Attack']} | "
-                f"Can Evolve: {poke['Can Evolve']}"
-            )
-            # The text label also fills horizontally and expands
-            label = tk.Label(frame, text=info, anchor="w")
-            label.pack(side="left", fill="x", expand=True)
-
-            image_path = os.path.join("pokemons", f"{poke['ID'] + 251}.png")
-            if os.path.exists(image_path):
-                try:
-                    img = Image.open(image_path)
-                    img = img.resize((80, 80), Image.ANTIALIAS)
-                    photo = ImageTk.PhotoImage(img)
-                    picLabel = tk.Label(frame, image=photo)
-                    picLabel.photo = photo  # keep reference
-                    picLabel.pack(side="right", padx=5)
-                except Exception as e:
-                    print(f"Error loading image {image_path}: {e}")
-                    # If error, we'll ignore and just not show the image
-
-    root.mainloop()
+# pokedex_gui.py
+
+import tkinter as tk
+from PIL import Image, ImageTk
+import mmap
+import os
+import queue
+import struct
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import ex7
+
+# Lists longer than this open in the virtualized view (see show_virtual_Pokedex_GUI)
+VIRTUAL_LIST_THRESHOLD = 200
+# Height in pixels of one row of the virtualized view (80px sprite + padding)
+ROW_HEIGHT = 100
+SPRITE_SIZE = (80, 80)
+SPRITE_FOLDER = "pokemons"
+# Sprite files are named after the ID + this offset (e.g. 252.png is ID 1)
+SPRITE_ID_OFFSET = 251
+# All thumbnails, resized and decoded, in one file (see build_sprite_atlas)
+SPRITE_ATLAS = os.path.join(SPRITE_FOLDER, "sprites.atlas")
+SPRITE_ATLAS_MAGIC = b"SPRITES1"
+# magic, number of sprites
+SPRITE_ATLAS_HEADER = struct.Struct("<8sI")
+# ID, mtime_ns and size of the PNG it was made from, and whether it could be read
+SPRITE_ATLAS_ENTRY = struct.Struct("<IqQ?")
+SPRITE_BYTES = SPRITE_SIZE[0] * SPRITE_SIZE[1] * 4  # RGBA
+# PhotoImages kept per window, least recently used dropped first
+SPRITE_CACHE_SIZE = 256
+SPRITE_DECODE_THREADS = 4
+# How often (ms) the Tk thread picks up decoded sprites
+SPRITE_POLL_MS = 20
+# How often (ms) a live window applies the pokedex changes queued since (about once a frame)
+EVENT_POLL_MS = 16
+
+
+def pokemon_info(poke):
+    return (
+        f"ID: {poke['ID']} | "
+        f"Name: {poke['Name']} | "
+        f"Type: {poke['Type']} | "
+        f"HP: {poke['HP']} | "
+        f"Attack: {poke['Attack']} | "
+        f"Can Evolve: {poke['Can Evolve']}"
+    )
+
+
+########################
+# Sprite cache
+########################
+
+def sprite_files(folder=SPRITE_FOLDER):
+    """
+    Return {Pokemon ID: (path, mtime_ns, size)} for the sprites in folder, from a
+    single directory scan (no per-Pokemon os.path.exists).
+    """
+    files = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if ext == ".png" and stem.isdecimal():
+                    stat = entry.stat()
+                    files[int(stem) - SPRITE_ID_OFFSET] = (entry.path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        pass
+    return files
+
+
+def decode_sprite(path):
+    """
+    Read a PNG and return it as SPRITE_SIZE RGBA bytes.
+    """
+    with Image.open(path) as img:
+        return img.convert("RGBA").resize(SPRITE_SIZE, Image.LANCZOS).tobytes()
+
+
+def build_sprite_atlas(files, atlas_path=SPRITE_ATLAS):
+    """
+    Decode and resize every sprite of `files` (see sprite_files) once and save them
+    as raw RGBA tiles in atlas_path, stamped with each PNG's mtime and size.
+    Unreadable PNGs get a blank tile and are marked as such; failing to write
+    (e.g. read-only folder) is ignored.
+    """
+    entries = []
+    tiles = []
+    for poke_id, (path, mtime_ns, size) in sorted(files.items()):
+        try:
+            tiles.append(decode_sprite(path))
+            readable = True
+        except Exception:
+            tiles.append(bytes(SPRITE_BYTES))
+            readable = False
+        entries.append(SPRITE_ATLAS_ENTRY.pack(poke_id, mtime_ns, size, readable))
+    temp_path = atlas_path + ".tmp"
+    try:
+        with open(temp_path, mode="wb") as f:
+            f.write(SPRITE_ATLAS_HEADER.pack(SPRITE_ATLAS_MAGIC, len(entries)))
+            f.writelines(entries)
+            f.writelines(tiles)
+        os.replace(temp_path, atlas_path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def open_sprite_atlas(files, atlas_path=SPRITE_ATLAS):
+    """
+    Map the sprite atlas. Return {'buffer': mmap, 'offsets': {ID: tile offset}}
+    (unreadable sprites have no offset), or None if there's none or any PNG was
+    added, removed or changed since it was built.
+    """
+    try:
+        with open(atlas_path, mode="rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, count = SPRITE_ATLAS_HEADER.unpack_from(buffer, 0)
+        entries_start = SPRITE_ATLAS_HEADER.size
+        tiles_start = entries_start + count * SPRITE_ATLAS_ENTRY.size
+        offsets = {}
+        stamps = {}
+        for i, (poke_id, mtime_ns, size, readable) in enumerate(
+                SPRITE_ATLAS_ENTRY.iter_unpack(buffer[entries_start:tiles_start])):
+            if readable:
+                offsets[poke_id] = tiles_start + i * SPRITE_BYTES
+            stamps[poke_id] = (mtime_ns, size)
+        if (magic != SPRITE_ATLAS_MAGIC or len(buffer) != tiles_start + count * SPRITE_BYTES
+                or stamps != {poke_id: stamp[1:] for poke_id, stamp in files.items()}):
+            buffer.close()
+            return None
+    except (struct.error, ValueError):
+        buffer.close()
+        return None
+    return {'buffer': buffer, 'offsets': offsets}
+
+
+def make_sprite_loader(root):
+    """
+    Return a sprite loader for the Tk window `root` (see request_sprite).
+    Sprites come from the atlas when it's up to date; otherwise they're decoded
+    from the PNGs and the atlas is rebuilt in the background for next time.
+    """
+    files = sprite_files()
+    loader = {
+        'root': root,
+        'files': files,
+        'atlas': open_sprite_atlas(files),
+        'cache': OrderedDict(),   # ID -> PhotoImage (or None: no sprite), LRU order
+        'waiting': {},            # ID -> callbacks waiting for its decode
+        'done': queue.Queue(),    # (ID, RGBA bytes or None) from the decode threads
+        'pool': ThreadPoolExecutor(max_workers=SPRITE_DECODE_THREADS),
+        'closed': False,
+    }
+    if loader['atlas'] is None and files:
+        loader['pool'].submit(build_sprite_atlas, files)
+    root.after(SPRITE_POLL_MS, poll_sprite_loader, loader)
+    return loader
+
+
+def load_sprite_bytes(loader, poke_id):
+    """
+    Return the RGBA thumbnail of poke_id (runs on a decode thread), or None.
+    """
+    atlas = loader['atlas']
+    if atlas is not None:
+        offset = atlas['offsets'].get(poke_id)
+        return None if offset is None else atlas['buffer'][offset:offset + SPRITE_BYTES]
+    path = loader['files'][poke_id][0]
+    try:
+        return decode_sprite(path)
+    except Exception as e:
+        print(f"Error loading image {path}: {e}")
+        # If error, we'll ignore and just not show the image
+        return None
+
+
+def request_sprite(loader, poke, callback):
+    """
+    Call callback(PhotoImage or None) on the Tk thread once the Pokemon's sprite
+    is ready: right away if it's cached, else after a decode thread loaded it.
+    """
+    poke_id = poke['ID']
+    cache = loader['cache']
+    if poke_id in cache:
+        cache.move_to_end(poke_id)
+        callback(cache[poke_id])
+        return
+    if poke_id not in loader['files']:
+        callback(None)
+        return
+    if poke_id in loader['waiting']:
+        loader['waiting'][poke_id].append(callback)
+        return
+    loader['waiting'][poke_id] = [callback]
+
+    def decode():
+        loader['done'].put((poke_id, load_sprite_bytes(loader, poke_id)))
+
+    loader['pool'].submit(decode)
+
+
+def poll_sprite_loader(loader):
+    """
+    On the Tk thread: turn decoded sprites into PhotoImages (Tk objects can only be
+    made here), cache them and call whoever was waiting.
+    """
+    if loader['closed']:
+        return
+    cache = loader['cache']
+    while True:
+        try:
+            poke_id, data = loader['done'].get_nowait()
+        except queue.Empty:
+            break
+        photo = ImageTk.PhotoImage(Image.frombytes("RGBA", SPRITE_SIZE, data)) if data else None
+        cache[poke_id] = photo
+        if len(cache) > SPRITE_CACHE_SIZE:
+            cache.popitem(last=False)
+        for callback in loader['waiting'].pop(poke_id, []):
+            callback(photo)
+    loader['root'].after(SPRITE_POLL_MS, poll_sprite_loader, loader)
+
+
+def close_sprite_loader(loader):
+    """
+    Stop the decode threads (an atlas build that's running still finishes).
+    """
+    loader['closed'] = True
+    loader['pool'].shutdown(wait=False, cancel_futures=True)
+
+
+########################
+# Windows
+########################
+
+def bind_mouse_wheel(canvas):
+    # Mouse wheel handling
+    def on_mouse_wheel(event):
+        # On Windows/macOS: event.delta is typically ±120 per wheel step
+        canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+
+    canvas.bind_all("<MouseWheel>", on_mouse_wheel)  # Windows/macOS
+    # For Linux (buttons 4=up, 5=down):
+    canvas.bind_all("<Button-4>", lambda e: canvas.yview_scroll(-1, "units"))
+    canvas.bind_all("<Button-5>", lambda e: canvas.yview_scroll(1, "units"))
+
+
+def show_Pokedex_GUI(pokeList, virtual=None):
+    """
+    Display each Pokemon in a simple Tkinter window with its Name, Type, HP,
+    Attack, and optionally an image from the 'pokemons' folder.
+    We allow horizontal resizing so each Pokemon 'frame' expands in width.
+    Long lists (or virtual=True) use the virtualized view, which only builds
+    the rows on screen.
+    """
+    if virtual is None:
+        virtual = len(pokeList) > VIRTUAL_LIST_THRESHOLD
+    if virtual:
+        show_virtual_Pokedex_GUI(pokeList)
+        return
+
+    root = tk.Tk()
+    root.title("My Pokedex GUI")
+
+    # Create a canvas and a vertical scrollbar
+    canvas = tk.Canvas(root)
+    scrollbar = tk.Scrollbar(root, orient="vertical", command=canvas.yview)
+    canvas.configure(yscrollcommand=scrollbar.set)
+
+    # This 'scrollable_frame' is where we'll place each Pokemon frame.
+    scrollable_frame = tk.Frame(canvas)
+
+    # A callback to update the scrollregion whenever 'scrollable_frame' changes size
+    def on_frame_configure(event):
+        canvas.configure(scrollregion=canvas.bbox("all"))
+
+    scrollable_frame.bind("<Configure>", on_frame_configure)
+
+    # Actually place 'scrollable_frame' in the canvas
+    # We'll store the canvas window ID so we can update its width on resize
+    canvas_window = canvas.create_window(
+        (0, 0), window=scrollable_frame, anchor="nw")
+
+    # A callback to keep the scrollable_frame the same width as the canvas
+    def on_canvas_configure(event):
+        # Set the scrollable_frame width to match canvas' width
+        canvas.itemconfig(canvas_window, width=event.width)
+
+    canvas.bind("<Configure>", on_canvas_configure)
+    bind_mouse_wheel(canvas)
+
+    # Pack the canvas and scrollbar
+    canvas.pack(side="left", fill="both", expand=True)
+    scrollbar.pack(side="right", fill="y")
+
+    sprites = make_sprite_loader(root)
+
+    if not pokeList:
+        msg = tk.Label(scrollable_frame, text="No Pokemon in this Pokedex!")
+        msg.pack(padx=10, pady=10)
+    else:
+        for poke in pokeList:
+            # Create a frame for each Pokémon, fill horizontally, expand so it can grow
+            frame = tk.Frame(scrollable_frame, bd=2,
+                             relief='groove', padx=5, pady=5)
+            frame.pack(side="top", fill="x", expand=True, padx=10, pady=5)
+
+            # The text label also fills horizontally and expands
+            label = tk.Label(frame, text=pokemon_info(poke), anchor="w")
+            label.pack(side="left", fill="x", expand=True)
+
+            # The window opens right away; each image is added once it's loaded
+            def show_sprite(photo, frame=frame):
+                if photo is not None:
+                    picLabel = tk.Label(frame, image=photo)
+                    picLabel.photo = photo  # keep reference
+                    picLabel.pack(side="right", padx=5)
+
+            request_sprite(sprites, poke, show_sprite)
+
+    root.mainloop()
+    close_sprite_loader(sprites)
+
+
+def visible_rows(top, height, count, row_height=ROW_HEIGHT):
+    """
+    Return the range of row indexes (out of `count`) that show when the view
+    starts at pixel `top` and is `height` pixels tall.
+    """
+    first = max(0, int(top // row_height))
+    last = min(count, int((top + height) // row_height) + 1)
+    return range(first, max(first, last))
+
+
+def apply_pokedex_events(pokedex, events):
+    """
+    Apply ex7 pokedex events (see ex7.watch_pokedex) to `pokedex`, an ID -> Pokemon
+    dict in display order: 'old' is taken out, 'new' goes at the end (or stays where
+    it is if it's already there). Return True if anything changed.
+    """
+    changed = False
+    for event in events:
+        if event['old'] is not None and pokedex.pop(event['old']['ID'], None) is not None:
+            changed = True
+        if event['new'] is not None and event['new']['ID'] not in pokedex:
+            pokedex[event['new']['ID']] = event['new']
+            changed = True
+    return changed
+
+
+def show_virtual_Pokedex_GUI(pokeList, events=None):
+    """
+    Same window as show_Pokedex_GUI, but only the rows in the visible part of the
+    canvas exist. The canvas is as tall as the whole list would be; a small pool of
+    row frames is moved to wherever the view is and refilled as it scrolls, and
+    row i always reuses pool slot i % pool size, so scrolling by one row only
+    refills one frame. Opening time and memory don't depend on the list's length.
+    With `events` (a queue.Queue of ex7 pokedex events), the list follows them live:
+    once per frame every queued event is applied and only the visible rows whose
+    Pokemon changed are refilled, so a burst of changes costs one redraw.
+    """
+    root = tk.Tk()
+    root.title("My Pokedex GUI")
+
+    canvas = tk.Canvas(root)
+    scrollbar = tk.Scrollbar(root, orient="vertical", command=canvas.yview)
+    canvas.pack(side="left", fill="both", expand=True)
+    scrollbar.pack(side="right", fill="y")
+    bind_mouse_wheel(canvas)
+    sprites = make_sprite_loader(root)
+
+    pokeList = list(pokeList)
+    empty = canvas.create_window((10, 10), window=tk.Label(canvas, text="No Pokemon in this Pokedex!"),
+                                 anchor="nw", state="normal" if not pokeList else "hidden")
+    if not pokeList and events is None:
+        root.mainloop()
+        close_sprite_loader(sprites)
+        return
+
+    # Scroll by one row per wheel step / arrow click
+    canvas.configure(scrollregion=(0, 0, 0, len(pokeList) * ROW_HEIGHT), yscrollincrement=ROW_HEIGHT)
+    # Pool of row widgets: each one is {'window', 'label', 'picture', 'index' and 'poke' it shows}
+    rows = []
+
+    def make_row():
+        frame = tk.Frame(canvas, bd=2, relief='groove', padx=5, pady=5)
+        label = tk.Label(frame, anchor="w")
+        label.pack(side="left", fill="x", expand=True)
+        picture = tk.Label(frame)
+        picture.pack(side="right", padx=5)
+        window = canvas.create_window((10, 0), window=frame, anchor="nw",
+                                      width=max(1, canvas.winfo_width() - 20), height=ROW_HEIGHT - 10)
+        return {'window': window, 'label': label, 'picture': picture, 'index': None, 'poke': None}
+
+    def fill_row(row, index):
+        poke = pokeList[index]
+        row['index'] = index
+        row['poke'] = poke
+        row['label'].configure(text=pokemon_info(poke))
+        row['picture'].configure(image='')
+        row['picture'].photo = None
+        canvas.coords(row['window'], 10, index * ROW_HEIGHT + 5)
+        canvas.itemconfig(row['window'], state="normal")
+
+        def show_sprite(photo):
+            # The row may have been recycled for another Pokemon while this loaded
+            if row['poke'] is poke and photo is not None:
+                row['picture'].configure(image=photo)
+                row['picture'].photo = photo  # keep reference
+
+        request_sprite(sprites, poke, show_sprite)
+
+    def render():
+        shown = visible_rows(canvas.canvasy(0), canvas.winfo_height(), len(pokeList))
+        # One spare row, so a partly scrolled view is always covered
+        while len(rows) < min(len(pokeList), len(shown) + 1):
+            rows.append(make_row())
+        for index in range(shown.start, min(len(pokeList), shown.start + len(rows))):
+            row = rows[index % len(rows)]
+            if row['index'] != index or row['poke'] is not pokeList[index]:
+                fill_row(row, index)
+        # Rows past the end of a list that got shorter
+        for row in rows:
+            if row['index'] is not None and row['index'] >= len(pokeList):
+                canvas.itemconfig(row['window'], state="hidden")
+                row['index'] = row['poke'] = None
+
+    # Called by the canvas whenever the view moves (wheel, scrollbar, resize)
+    def on_yscroll(first, last):
+        scrollbar.set(first, last)
+        render()
+
+    canvas.configure(yscrollcommand=on_yscroll)
+
+    def on_canvas_configure(event):
+        for row in rows:
+            canvas.itemconfig(row['window'], width=max(1, event.width - 20))
+        render()
+
+    canvas.bind("<Configure>", on_canvas_configure)
+
+    if events is not None:
+        pokedex = {poke['ID']: poke for poke in pokeList}
+
+        def poll_events():
+            burst = []
+            while True:
+                try:
+                    burst.append(events.get_nowait())
+                except queue.Empty:
+                    break
+            if burst and apply_pokedex_events(pokedex, burst):
+                pokeList[:] = pokedex.values()
+                canvas.itemconfig(empty, state="normal" if not pokeList else "hidden")
+                canvas.configure(scrollregion=(0, 0, 0, len(pokeList) * ROW_HEIGHT))
+                render()
+            root.after(EVENT_POLL_MS, poll_events)
+
+        root.after(EVENT_POLL_MS, poll_events)
+
+    root.mainloop()
+    close_sprite_loader(sprites)
+
+
+def show_live_Pokedex_GUI(owner_node):
+    """
+    Show an owner's pokedex in the virtualized view and keep it in sync with every
+    add / release / evolve made through ex7 (from any thread) while it's open.
+    """
+    owner_key = owner_node['name'].lower()
+    events = queue.Queue()
+
+    def on_change(event):
+        if event['owner'].lower() == owner_key:
+            events.put(event)
+
+    # Listen before taking the list, so no change falls in between
+    # (applying an event the list already has is a no-op)
+    ex7.watch_pokedex(on_change)
+    try:
+        show_virtual_Pokedex_GUI(ex7.pokedex_pokemon(owner_node), events)
+    finally:
+        ex7.unwatch_pokedex(on_change)
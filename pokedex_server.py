@@ -0,0 +1,242 @@
+# pokedex_server.py
+
+import argparse
+import asyncio
+import io
+import random
+import time
+
+import ex7
+import pokedex_shards
+
+# Every response ends with this line
+END_OF_RESPONSE = "."
+DEFAULT_PORT = 8765
+# With serve --shards, the running shard processes (see pokedex_shards.start_shards)
+shards = None
+
+
+# Commands that only read the tree they're given; with --copy-on-write they run on a
+# snapshot in a worker thread
+READ_ONLY_COMMANDS = ('print', 'query', 'sort', 'owners', 'report', 'metrics')
+
+
+def run_command(line):
+    """
+    Run one batch command (see ex7.BATCH_COMMANDS) on the shared tree and return its output.
+    Commands run one at a time on the event loop thread, so the tree only ever has
+    a single writer, and a command never sees another one half-done.
+    """
+    out = io.StringIO()
+    sink = ex7.make_output_sink(out)
+    try:
+        words = ex7.split_batch_line(line)
+        if words:
+            ex7.owner_root = ex7.run_batch_command(ex7.owner_root, words, sink)
+    except ValueError as e:
+        ex7.sink_write(sink, f"error: {e}")
+    ex7.maybe_compact_owner_store(ex7.owner_root)
+    ex7.flush_output_sink(sink)
+    return out.getvalue()
+
+
+async def run_sharded_command(line):
+    """
+    run_command with --shards: the command goes to the shard processes and its reply
+    is awaited, so the event loop keeps serving the other clients meanwhile, and
+    their commands go out to the shards without waiting for this one's (see
+    pokedex_shards.send_shard_request).
+    """
+    out = io.StringIO()
+    sink = ex7.make_output_sink(out)
+    try:
+        words = ex7.split_batch_line(line)
+        if words:
+            await pokedex_shards.run_sharded_command(shards, words, sink)
+    except ValueError as e:
+        ex7.sink_write(sink, f"error: {e}")
+    ex7.flush_output_sink(sink)
+    return out.getvalue()
+
+
+def run_read_command(root, words):
+    """
+    Run a read-only command on a snapshot root (see ex7.snapshot_owner_tree).
+    Safe from any thread: the snapshot's nodes never change.
+    """
+    out = io.StringIO()
+    sink = ex7.make_output_sink(out)
+    try:
+        ex7.run_batch_command(root, words, sink)
+    except ValueError as e:
+        ex7.sink_write(sink, f"error: {e}")
+    ex7.flush_output_sink(sink)
+    return out.getvalue()
+
+
+async def respond(line):
+    """
+    Return the output of one command. With ex7.COPY_ON_WRITE_TREE, reads (e.g. printing
+    or sorting a big tree) run in the default thread pool on the current snapshot, so they don't
+    hold up the writes queued on the event loop.
+    """
+    if shards is not None:
+        return await run_sharded_command(line)
+    if ex7.COPY_ON_WRITE_TREE:
+        try:
+            words = ex7.split_batch_line(line)
+        except ValueError:
+            words = None
+        if words and words[0].lower() in READ_ONLY_COMMANDS:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, run_read_command, ex7.snapshot_owner_tree(), words)
+    return run_command(line)
+
+
+async def handle_client(reader, writer):
+    """
+    Serve one client: read a command per line, answer with its output and a '.' line.
+    The answer is built in one go and then streamed, so a slow client only waits
+    for its own socket and never holds up the other clients.
+    """
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            response = await respond(line.decode('utf-8').strip())
+            writer.write(response.encode('utf-8') + (END_OF_RESPONSE + "\n").encode('utf-8'))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port):
+    if shards is not None:
+        pokedex_shards.watch_shards(shards, asyncio.get_running_loop())
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"Pokedex server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+########################
+# Load test client
+########################
+
+async def send_command(reader, writer, command):
+    """
+    Send one command and return its output lines (without the '.' line).
+    """
+    writer.write((command + "\n").encode('utf-8'))
+    await writer.drain()
+    lines = []
+    while True:
+        line = (await reader.readline()).decode('utf-8').rstrip("\n")
+        if line == END_OF_RESPONSE:
+            return lines
+        lines.append(line)
+
+
+async def load_test_client(host, port, client_id, requests, latencies, seed):
+    """
+    One simulated user: create an owner, then a random mix of adds, releases,
+    evolves and queries. Each request's latency (seconds) goes to `latencies`.
+    """
+    rng = random.Random(seed)
+    species = ex7.species()['data']
+    owner = f"load{client_id}"
+    reader, writer = await asyncio.open_connection(host, port)
+    commands = [f"create {owner} {rng.choice((1, 4, 7))}"]
+    for _ in range(requests - 1):
+        choice = rng.random()
+        if choice < 0.4:
+            commands.append(f"add {owner} {rng.choice(species)['ID']}")
+        elif choice < 0.55:
+            commands.append(f"release {owner} {rng.choice(species)['Name']}")
+        elif choice < 0.7:
+            commands.append(f"evolve {owner} {rng.choice(species)['Name']}")
+        elif choice < 0.95:
+            commands.append(f"query {owner} attack>{rng.randrange(150)}")
+        else:
+            commands.append("sort")
+    for command in commands:
+        start = time.perf_counter()
+        await send_command(reader, writer, command)
+        latencies.append(time.perf_counter() - start)
+    await send_command(reader, writer, f"delete {owner}")
+    writer.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def load_test(host, port, clients, requests):
+    """
+    Run `clients` concurrent clients of `requests` requests each; print p50/p99 latency.
+    """
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(load_test_client(host, port, client_id, requests, latencies, client_id)
+                           for client_id in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} req/s)")
+    print(f"p50 {percentile(latencies, 0.50) * 1e3:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1e3:.2f} ms, "
+          f"max {latencies[-1] * 1e3:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Pokedex over TCP, one batch command per line")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    serve_parser = subparsers.add_parser("serve", help="run the server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--balanced", action="store_true",
+                              help="keep the owner BST height-balanced (AVL)")
+    serve_parser.add_argument("--copy-on-write", action="store_true",
+                              help="serve the read-only commands from tree snapshots in worker threads")
+    serve_parser.add_argument("--metrics", action="store_true",
+                              help="record call counts and timings (read them with the 'metrics' command)")
+    serve_parser.add_argument("--shards", type=int, default=0,
+                              help="spread the owners over this many worker processes")
+    serve_parser.add_argument("--store", metavar="DIR",
+                              help="load the owners from DIR and save every change back to it")
+    load_parser = subparsers.add_parser("loadtest", help="hammer a running server and report latency")
+    load_parser.add_argument("--host", default="127.0.0.1")
+    load_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    load_parser.add_argument("--clients", type=int, default=50)
+    load_parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        global shards
+        ex7.BALANCED_OWNER_TREE = args.balanced
+        ex7.COPY_ON_WRITE_TREE = args.copy_on_write
+        if args.metrics:
+            ex7.enable_metrics()
+        if args.shards:
+            # Each shard keeps its own tree (and store); this process only routes
+            shards = pokedex_shards.start_shards(args.shards, args.balanced, args.store)
+        elif args.store:
+            ex7.owner_root = ex7.open_owner_store(args.store)
+        try:
+            asyncio.run(serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if shards is not None:
+                pokedex_shards.stop_shards(shards)
+            ex7.close_owner_store(ex7.owner_root)
+            ex7.close_report_pool()
+    else:
+        asyncio.run(load_test(args.host, args.port, args.clients, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# pokedex_shards.py
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import sys
+import zlib
+from collections import deque
+from heapq import heapify, heappop, heapreplace, merge
+
+import ex7
+
+# Owners fetched from a shard per request when merging ordered output
+SHARD_PAGE = 1000
+# Requests the coordinator may have out on one shard at a time (see send_shard_request).
+# Keeps the requests waiting in a pipe well under its buffer size, so sending never
+# blocks on a shard that is itself blocked sending us a reply.
+SHARD_PIPELINE_DEPTH = 64
+# Commands that name an owner, and go to that owner's shard
+OWNER_COMMANDS = ('create', 'add', 'release', 'evolve', 'delete', 'query')
+
+
+########################
+# Shard worker (one process per shard)
+########################
+
+def render_owner(owner):
+    """
+    Return the text print_owner writes for one owner.
+    """
+    out = io.StringIO()
+    sink = ex7.make_output_sink(out)
+    ex7.print_owner(owner, sink)
+    ex7.flush_output_sink(sink)
+    return out.getvalue()
+
+
+def owner_line(owner):
+    return f"Owner: {owner['name']} (has {len(owner['pokedex'])} Pokemon)"
+
+
+def handle_shard_request(request):
+    """
+    Run one coordinator request on this process's tree (ex7.owner_root) and return
+    the reply. Paged requests take (cursor, limit) and return (page, next cursor),
+    the page being a list of (sort key, text) in order, ready for the coordinator to merge.
+    """
+    op, args = request[0], request[1:]
+    if op == 'command':
+        out = io.StringIO()
+        sink = ex7.make_output_sink(out)
+        try:
+            ex7.owner_root = ex7.run_batch_command(ex7.owner_root, args[0], sink)
+        except ValueError as e:
+            return {'error': str(e)}
+        finally:
+            ex7.maybe_compact_owner_store(ex7.owner_root)
+        ex7.flush_output_sink(sink)
+        return {'output': out.getvalue()}
+    if op == 'print page':
+        after, limit = args
+        page, cursor = ex7.owners_page(ex7.owner_root, limit, after)
+        return [(owner['name'].lower(), render_owner(owner)) for owner in page], cursor
+    if op == 'owners page':
+        page, cursor = ex7.owners_page(ex7.owner_root, **args[0])
+        return [(owner['name'].lower(), owner_line(owner), owner['name']) for owner in page], cursor
+    if op == 'ranking':
+        # All at once rather than in pages: the coordinator serves other requests between
+        # pages, and an owner whose pokedex changed meanwhile would move across the cut
+        return [((len(owner['pokedex']), owner['name'].lower()), owner_line(owner))
+                for owner in ex7.owners_by_num_pokemon(ex7.owner_root)]
+    if op == 'traversal':
+        out = io.StringIO()
+        sink = ex7.make_output_sink(out)
+        ex7.write_owners(ex7.TRAVERSALS[args[0]](ex7.owner_root), sink)
+        ex7.flush_output_sink(sink)
+        return out.getvalue()
+    raise ValueError(f"unknown shard request '{op}'")
+
+
+def shard_worker(conn, balanced, store_dir):
+    """
+    Serve coordinator requests on conn until it sends ('stop',) or goes away.
+    Each shard is a whole ex7 tree of its own (with its own store directory, if any).
+    """
+    ex7.BALANCED_OWNER_TREE = balanced
+    if store_dir:
+        ex7.owner_root = ex7.open_owner_store(store_dir)
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request[0] == 'stop':
+                break
+            try:
+                reply = handle_shard_request(request)
+            except Exception as e:
+                # A request that fails gets an error reply, like a bad command; the shard keeps
+                # serving, and its tree is no worse off than after a failed batch command
+                reply = {'error': f"{type(e).__name__}: {e}" if not isinstance(e, ValueError) else str(e)}
+            conn.send(reply)
+    finally:
+        ex7.close_owner_store(ex7.owner_root)
+        ex7.close_report_pool()
+        conn.close()
+
+
+########################
+# Coordinator
+########################
+
+def start_shards(count, balanced=False, store=None):
+    """
+    Start `count` shard processes, each talking to us over its own pipe.
+    With store, shard i keeps its owners in store/shard-i. The shard count is saved
+    in store/shards.json: owners are placed by hash, so reopening a store with a
+    different count would lose track of them.
+    """
+    if store:
+        os.makedirs(store, exist_ok=True)
+        layout_path = os.path.join(store, 'shards.json')
+        if os.path.exists(layout_path):
+            with open(layout_path, mode='r', encoding='utf-8') as f:
+                saved = json.load(f)['shards']
+            if saved != count:
+                raise ValueError(f"{store} holds {saved} shards, not {count}")
+        else:
+            with open(layout_path, mode='w', encoding='utf-8') as f:
+                json.dump({'shards': count}, f)
+    shards = {'conns': [], 'processes': []}
+    for shard_id in range(count):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        store_dir = os.path.join(store, f'shard-{shard_id}') if store else None
+        process = multiprocessing.Process(target=shard_worker, args=(child_conn, balanced, store_dir),
+                                          name=f'pokedex-shard-{shard_id}', daemon=True)
+        process.start()
+        child_conn.close()
+        shards['conns'].append(parent_conn)
+        shards['processes'].append(process)
+    return shards
+
+
+def stop_shards(shards):
+    """
+    Ask every shard to save and exit, and wait for them.
+    """
+    for conn in shards['conns']:
+        try:
+            conn.send(('stop',))
+        except (BrokenPipeError, OSError):
+            pass
+    for process in shards['processes']:
+        process.join()
+    for conn in shards['conns']:
+        conn.close()
+
+
+def shard_of(shards, owner_name):
+    """
+    Return the index of the shard that holds owner_name. Uses crc32 of the lower-cased
+    name rather than hash(), which differs from one process (run) to the next.
+    """
+    return zlib.crc32(owner_name.lower().encode('utf-8')) % len(shards['conns'])
+
+
+def check_shard_reply(reply):
+    """
+    Return a shard's reply, or raise ValueError if the shard rejected the request.
+    """
+    if isinstance(reply, dict) and 'error' in reply:
+        raise ValueError(reply['error'])
+    return reply
+
+
+def watch_shards(shards, loop):
+    """
+    Start taking the shards' replies on the event loop: each pipe gets a FIFO of
+    futures, one per request sent and not answered yet (see send_shard_request).
+    A shard answers its requests in order, so each reply goes to the oldest future.
+    """
+    shards['waiting'] = [deque() for _ in shards['conns']]
+    for index, conn in enumerate(shards['conns']):
+        loop.add_reader(conn.fileno(), receive_shard_replies, shards, index)
+
+
+def unwatch_shards(shards, loop):
+    for conn in shards['conns']:
+        loop.remove_reader(conn.fileno())
+
+
+def receive_shard_replies(shards, index):
+    """
+    Hand the replies waiting on shard `index`'s pipe to their futures.
+    """
+    conn = shards['conns'][index]
+    waiting = shards['waiting'][index]
+    while conn.poll():
+        try:
+            reply = conn.recv()
+        except EOFError:
+            # The shard process is gone: fail whatever was waiting on it
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            for future in waiting:
+                if not future.cancelled():
+                    future.set_exception(ConnectionError(f"shard {index} stopped"))
+            waiting.clear()
+            return
+        future = waiting.popleft()
+        # The coroutine that asked may be gone (e.g. its client disconnected)
+        if not future.cancelled():
+            future.set_result(reply)
+
+
+async def send_shard_request(shards, index, *request):
+    """
+    Send a request to shard `index` without waiting for the answers to the ones
+    before it, and return a future for its reply. With SHARD_PIPELINE_DEPTH requests
+    already out on that shard, first wait for the oldest to be answered.
+    """
+    waiting = shards['waiting'][index]
+    while len(waiting) >= SHARD_PIPELINE_DEPTH:
+        # asyncio.wait, unlike awaiting the future, doesn't cancel someone else's request
+        await asyncio.wait([waiting[0]])
+    future = asyncio.get_running_loop().create_future()
+    waiting.append(future)
+    shards['conns'][index].send(request)
+    return future
+
+
+async def shard_call(shards, index, *request):
+    future = await send_shard_request(shards, index, *request)
+    return check_shard_reply(await future)
+
+
+async def shard_broadcast(shards, *request):
+    """
+    Send the same request to every shard, then collect the replies (in shard order).
+    The shards work on it at the same time.
+    """
+    futures = [await send_shard_request(shards, index, *request) for index in range(len(shards['conns']))]
+    return [check_shard_reply(reply) for reply in await asyncio.gather(*futures)]
+
+
+async def iter_shard_pages(shards, index, op, cursor):
+    """
+    Yield the (key, text) items of one shard's ordered output, fetching SHARD_PAGE
+    at a time and only when the previous page is used up.
+    """
+    while True:
+        page, cursor = await shard_call(shards, index, op, cursor, SHARD_PAGE)
+        for item in page:
+            yield item
+        if cursor is None:
+            return
+
+
+async def merge_shards(shards, op, cursor):
+    """
+    k-way merge of every shard's ordered output into one ordered stream of text.
+    heapq.merge for async streams: a heap of each stream's next (key, shard, text).
+    """
+    streams = [iter_shard_pages(shards, index, op, cursor) for index in range(len(shards['conns']))]
+    heap = []
+    for index, stream in enumerate(streams):
+        async for key, text in stream:
+            heap.append((key, index, text))
+            break
+    heapify(heap)
+    while heap:
+        _, index, text = heap[0]
+        yield text
+        async for key, text in streams[index]:
+            heapreplace(heap, (key, index, text))
+            break
+        else:
+            heappop(heap)
+
+
+async def sharded_owners_page(shards, options):
+    """
+    One page of the 'owners' command across shards: ask each shard for a page,
+    merge them and keep the first `limit`. Return (owner lines, cursor).
+    """
+    limit = options['limit']
+    replies = await shard_broadcast(shards, 'owners page', options)
+    items = list(merge(*(page for page, _ in replies), key=lambda item: item[0]))
+    more = len(items) > limit or any(cursor is not None for _, cursor in replies)
+    page = items[:limit]
+    return [line for _, line, _ in page], (page[-1][2] if more and page else None)
+
+
+def command_shard(shards, words):
+    """
+    Return the shard an owner command (see OWNER_COMMANDS) goes to. Without an owner
+    any shard will do, to report the usage error.
+    """
+    return shard_of(shards, words[1]) if len(words) > 1 else 0
+
+
+async def run_sharded_command(shards, words, sink):
+    """
+    run_batch_command for a sharded store: owner commands go to the owner's shard,
+    'sort', 'print' (in-order) and 'owners' merge every shard's output in order.
+    'print bfs|pre|post' have no single tree to follow, so they list shard by shard.
+    Bad commands raise ValueError. Needs watch_shards().
+    """
+    command, args = words[0].lower(), words[1:]
+    if command in OWNER_COMMANDS:
+        reply = await shard_call(shards, command_shard(shards, words), 'command', words)
+        sink_text(sink, reply['output'])
+    elif command == 'sort':
+        rankings = await shard_broadcast(shards, 'ranking')
+        ex7.sink_extend(sink, [text for _, text in merge(*rankings, key=lambda item: item[0])])
+    elif command == 'print':
+        order = args[0].lower() if args else 'in'
+        if order not in ex7.TRAVERSALS:
+            raise ValueError(f"unknown traversal '{order}'")
+        if order == 'in':
+            async for text in merge_shards(shards, 'print page', None):
+                sink_text(sink, text)
+        else:
+            for text in await shard_broadcast(shards, 'traversal', order):
+                sink_text(sink, text)
+    elif command == 'owners':
+        lines, cursor = await sharded_owners_page(shards, ex7.parse_owners_options(args))
+        ex7.sink_extend(sink, lines)
+        if cursor is not None:
+            ex7.sink_write(sink, f"next: {cursor}")
+    elif command in ('report', 'metrics'):
+        raise ValueError(f"'{command}' isn't supported with shards")
+    else:
+        raise ValueError(f"unknown command '{command}'")
+
+
+def sink_text(sink, text):
+    """
+    Write text that a shard rendered (newline-terminated lines) to sink.
+    """
+    if text:
+        ex7.sink_extend(sink, text[:-1].split('\n'))
+
+
+async def write_command_replies(sink, pending, wait=True):
+    """
+    Write the replies of the pipelined owner commands in `pending` ((line number, future),
+    in line order) to sink, removing them. With wait=False, stop at the first one
+    that hasn't been answered yet.
+    """
+    while pending and (wait or pending[0][1].done()):
+        line_number, future = pending.popleft()
+        reply = await future
+        if 'error' in reply:
+            ex7.sink_write(sink, f"error: line {line_number}: {reply['error']}")
+        else:
+            sink_text(sink, reply['output'])
+
+
+async def pipeline_sharded_batch(shards, lines, sink):
+    """
+    The body of run_sharded_batch, on a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    watch_shards(shards, loop)
+    # Owner commands sent and not written out yet: (line number, reply future), in line order
+    pending = deque()
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                words = ex7.split_batch_line(line)
+                if not words:
+                    continue
+                if words[0].lower() in OWNER_COMMANDS:
+                    future = await send_shard_request(shards, command_shard(shards, words), 'command', words)
+                    pending.append((line_number, future))
+                    await write_command_replies(sink, pending, wait=False)
+                    continue
+                # Every other command reads all the shards, so it waits for the changes before it
+                await write_command_replies(sink, pending)
+                await run_sharded_command(shards, words, sink)
+            except ValueError as e:
+                await write_command_replies(sink, pending)
+                ex7.sink_write(sink, f"error: line {line_number}: {e}")
+        await write_command_replies(sink, pending)
+    finally:
+        unwatch_shards(shards, loop)
+
+
+def run_sharded_batch(shards, lines, sink=None):
+    """
+    run_batch for a sharded store: run each command line, reporting errors per line.
+    Owner commands are pipelined: each is sent to its shard without waiting for the
+    replies to the ones before it, so the shards work at the same time. An owner's
+    commands all go to its shard, which runs them in order, and the output is
+    written in line order, so the result is the same as running them one by one.
+    """
+    if sink is None:
+        sink = ex7.make_output_sink()
+    asyncio.run(pipeline_sharded_batch(shards, lines, sink))
+    ex7.flush_output_sink(sink)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run batch commands on owners spread over worker processes",
+                                     epilog=ex7.BATCH_COMMANDS, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--balanced", action="store_true",
+                        help="keep each shard's owner BST height-balanced (AVL)")
+    parser.add_argument("--store", metavar="DIR",
+                        help="load the owners from DIR and save every change back to it")
+    parser.add_argument("--batch", metavar="FILE", default="-", help="commands to run ('-' for stdin)")
+    parser.add_argument("--output", metavar="FILE", default="stdout",
+                        help="where the results go: a file, 'stdout' or 'null'")
+    args = parser.parse_args()
+
+    shards = start_shards(args.shards, args.balanced, args.store)
+    sink = ex7.make_output_sink(args.output)
+    try:
+        if args.batch == '-':
+            run_sharded_batch(shards, sys.stdin, sink)
+        else:
+            with open(args.batch, mode='r', encoding='utf-8') as f:
+                run_sharded_batch(shards, f, sink)
+    finally:
+        ex7.close_output_sink(sink)
+        stop_shards(shards)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# test_ex7.py
+
+import os
+import random
+import tempfile
+import unittest
+
+import ex7
+
+
+def make_script(seed, owners=60, steps=600):
+    """
+    Return batch lines that create, delete and change owners at random.
+    """
+    rng = random.Random(seed)
+    names = [f"{rng.choice(('ash', 'Brock', 'misty', 'May'))}{i}" for i in range(owners)]
+    lines = [f"create {name} {rng.choice((1, 4, 7))}" for name in names]
+    for _ in range(steps):
+        name = rng.choice(names)
+        choice = rng.random()
+        if choice < 0.1:
+            lines.append(f"create {name} {rng.choice((1, 4, 7))}")
+        elif choice < 0.2:
+            lines.append(f"delete {name}")
+        elif choice < 0.6:
+            lines.append(f"add {name} {rng.randint(1, 140)}")
+        elif choice < 0.8:
+            lines.append(f"release {name} {rng.choice(('Treecko', 'Torchic', 'Mudkip', 'Wurmple'))}")
+        else:
+            lines.append(f"evolve {name} {rng.choice(('Treecko', 'Torchic', 'Mudkip', 'Wurmple'))}")
+    return lines
+
+
+def tree_contents(root):
+    """
+    Return [(owner name, [Pokemon IDs])] in name order.
+    """
+    return [(node['name'], list(node['pokedex'])) for node in ex7.iter_inorder(root)]
+
+
+class OwnerTreeTestCase(unittest.TestCase):
+    """
+    Puts the tree modes back and starts every test from an empty, indexed tree.
+    """
+
+    def setUp(self):
+        self.modes = ex7.BALANCED_OWNER_TREE, ex7.COPY_ON_WRITE_TREE
+        ex7.reset_owner_index()
+        ex7.owner_root = None
+
+    def tearDown(self):
+        ex7.close_owner_store(ex7.owner_root, save=False)
+        ex7.BALANCED_OWNER_TREE, ex7.COPY_ON_WRITE_TREE = self.modes
+        ex7.reset_owner_index()
+        ex7.owner_root = None
+
+    def run_script(self, lines):
+        ex7.owner_root = ex7.run_batch(ex7.owner_root, lines, ex7.make_output_sink('null'))
+        return ex7.owner_root
+
+
+class SnapshotTest(OwnerTreeTestCase):
+    """
+    A snapshot keeps showing the tree as it was when it was taken.
+    """
+
+    def check_snapshot(self, balanced, copy_on_write):
+        ex7.BALANCED_OWNER_TREE, ex7.COPY_ON_WRITE_TREE = balanced, copy_on_write
+        root = self.run_script(make_script(1))
+        snapshot = ex7.snapshot_owner_tree()
+        contents = tree_contents(snapshot)
+        ranking = [node['name'] for node in ex7.owners_by_num_pokemon(snapshot)]
+        torchic_owners = [node['name'] for node in ex7.owners_of_species(snapshot, 4)]
+        self.assertEqual(contents, tree_contents(root))
+
+        root = self.run_script(make_script(2))
+        for name, _ in contents[::3]:
+            root, _ = ex7.remove_owner(root, name)
+            ex7.owner_root = root
+        self.assertNotEqual(tree_contents(root), contents)
+
+        self.assertEqual(tree_contents(snapshot), contents)
+        self.assertEqual([node['name'] for node in ex7.owners_by_num_pokemon(snapshot)], ranking)
+        self.assertEqual([node['name'] for node in ex7.owners_of_species(snapshot, 4)], torchic_owners)
+        self.assertEqual([ex7.find_owner(snapshot, name)['name'] for name, _ in contents],
+                         [name for name, _ in contents])
+
+    def test_copied_snapshot(self):
+        self.check_snapshot(balanced=False, copy_on_write=False)
+
+    def test_copy_on_write_snapshot(self):
+        self.check_snapshot(balanced=True, copy_on_write=True)
+
+
+class OwnerStoreTest(OwnerTreeTestCase):
+    """
+    A store reopened after a crash holds the tree as of the last logged operation.
+    """
+
+    def check_reopen(self, balanced, copy_on_write):
+        ex7.BALANCED_OWNER_TREE, ex7.COPY_ON_WRITE_TREE = balanced, copy_on_write
+        with tempfile.TemporaryDirectory() as directory:
+            ex7.owner_root = ex7.open_owner_store(directory)
+            self.run_script(make_script(3))
+            ex7.save_owner_snapshot(ex7.owner_root)
+            root = self.run_script(make_script(4))
+            expected = tree_contents(root)
+            # Crash: no final snapshot, and the last log line was only half written
+            ex7.close_owner_store(root, save=False)
+            with open(os.path.join(directory, 'operations.jsonl'), mode='a', encoding='utf-8') as f:
+                f.write('{"seq": 100000, "op": "delete", "own')
+
+            ex7.owner_root = root = ex7.open_owner_store(directory)
+            self.assertEqual(tree_contents(root), expected)
+            self.assertEqual(sorted(ex7.owner_index), sorted(name.lower() for name, _ in expected))
+            self.assertEqual(ex7.owner_ranking, sorted((len(pokedex), name.lower()) for name, pokedex in expected))
+            ex7.close_owner_store(root)
+
+            # A clean close leaves only a snapshot, which loads the same tree
+            ex7.owner_root = root = ex7.open_owner_store(directory)
+            self.assertEqual(tree_contents(root), expected)
+            self.assertEqual(os.path.getsize(os.path.join(directory, 'operations.jsonl')), 0)
+
+    def test_plain_store(self):
+        self.check_reopen(balanced=False, copy_on_write=False)
+
+    def test_copy_on_write_store(self):
+        self.check_reopen(balanced=True, copy_on_write=True)
+
+
+class OwnerRangeTest(OwnerTreeTestCase):
+    """
+    owners_page, owners_between and owners_with_prefix agree with filtering a sorted list.
+    """
+
+    def build(self, balanced, seed):
+        ex7.BALANCED_OWNER_TREE = balanced
+        rng = random.Random(seed)
+        names = list({f"{rng.choice(('a', 'B', 'ab', 'Ac', 'm', 'Mo', 'z'))}{rng.randrange(500)}".lower():
+                      None for _ in range(300)})
+        names = [name.capitalize() if rng.random() < 0.5 else name for name in names]
+        root = None
+        for name in names:
+            root, _ = ex7.create_owner(root, name, 1)
+        ex7.owner_root = root
+        return root, sorted(names, key=str.lower)
+
+    def check_ranges(self, balanced, seed):
+        root, names = self.build(balanced, seed)
+        rng = random.Random(seed)
+        bounds = [None, '', 'a', 'Ab', 'b1', 'm', 'MO3', 'n', 'z9', '~'] + rng.sample(names, 5)
+        for _ in range(300):
+            prefix, low, high, after = (rng.choice(bounds) for _ in range(4))
+            limit = rng.randint(1, 8)
+            matches = [name for name in names
+                       if (prefix is None or name.lower().startswith(prefix.lower()))
+                       and (low is None or name.lower() >= low.lower())
+                       and (high is None or name.lower() < high.lower())
+                       and (after is None or name.lower() > after.lower())]
+            page, cursor = ex7.owners_page(root, limit, after, prefix, low, high)
+            self.assertEqual([node['name'] for node in page], matches[:limit], (limit, after, prefix, low, high))
+            self.assertEqual(cursor, matches[limit - 1] if len(matches) > limit else None)
+
+            if low is not None:
+                in_range = [name for name in names if name.lower() >= low.lower()
+                            and (high is None or name.lower() < high.lower())]
+                self.assertEqual([node['name'] for node in ex7.owners_between(root, low, high, limit)],
+                                 in_range[:limit])
+                self.assertEqual([node['name'] for node in ex7.owners_between(root, low, high)], in_range)
+            if prefix is not None:
+                with_prefix = [name for name in names if name.lower().startswith(prefix.lower())]
+                self.assertEqual([node['name'] for node in ex7.owners_with_prefix(root, prefix, limit)],
+                                 with_prefix[:limit])
+                self.assertEqual([node['name'] for node in ex7.owners_with_prefix(root, prefix)], with_prefix)
+
+        # Paging through the whole tree visits every owner once, in order
+        seen, cursor = [], None
+        while True:
+            page, cursor = ex7.owners_page(root, 7, cursor)
+            seen += [node['name'] for node in page]
+            if cursor is None:
+                break
+        self.assertEqual(seen, names)
+        with self.assertRaises(ValueError):
+            ex7.owners_page(root, 0)
+
+    def test_plain_tree(self):
+        self.check_ranges(balanced=False, seed=5)
+
+    def test_balanced_tree(self):
+        self.check_ranges(balanced=True, seed=6)
+
+
+class SplitBatchLineTest(unittest.TestCase):
+
+    def test_comments(self):
+        self.assertEqual(ex7.split_batch_line("add ash 4  # Torchic"), ['add', 'ash', '4'])
+        self.assertEqual(ex7.split_batch_line('create "Ash K" 1 # quoted'), ['create', 'Ash K', '1'])
+        self.assertEqual(ex7.split_batch_line("# only a comment"), [])
+        self.assertEqual(ex7.split_batch_line("print bfs"), ['print', 'bfs'])
+
+
+if __name__ == "__main__":
+    unittest.main()
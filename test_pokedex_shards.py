@@ -0,0 +1,147 @@
+# test_pokedex_shards.py
+
+import asyncio
+import io
+import random
+import unittest
+
+import ex7
+import pokedex_shards
+
+# Traversals that list each shard's tree in turn, so only their set of owners matches
+SHARD_BY_SHARD = ('print bfs', 'print pre', 'print post')
+# Commands the sharded store doesn't run; they must fail cleanly and leave the shards serving
+UNSUPPORTED = ('report', 'metrics')
+
+
+def make_script(seed, owners=40, steps=400):
+    """
+    Return batch lines that use every BATCH_COMMANDS verb, including bad uses of them.
+    """
+    rng = random.Random(seed)
+    names = [f"{rng.choice(('ash', 'Brock', 'misty', 'May'))}{i}" for i in range(owners)]
+    lines = [f"create {name} {rng.choice((1, 4, 7))}" for name in names[:owners // 2]]
+    for _ in range(steps):
+        name = rng.choice(names)
+        choice = rng.random()
+        if choice < 0.15:
+            lines.append(f"create {name} {rng.choice((1, 4, 7))}")
+        elif choice < 0.2:
+            lines.append(f"delete {name}")
+        elif choice < 0.45:
+            lines.append(f"add {name} {rng.randint(1, 140)}")
+        elif choice < 0.55:
+            lines.append(f"release {name} {rng.choice(('Treecko', 'Torchic', 'Mudkip'))}")
+        elif choice < 0.65:
+            lines.append(f"evolve {name} {rng.choice(('Treecko', 'Torchic', 'Mudkip'))}")
+        elif choice < 0.72:
+            lines.append(f"query {name} {rng.choice(('', 'type=fire', 'evolvable=yes', 'attack>50'))}")
+        elif choice < 0.8:
+            lines.append(rng.choice((f"owners prefix=m limit=3 after={name}", "owners from=b to=n limit=4",
+                                     "owners limit=0", f"owners after={name}")))
+        elif choice < 0.84:
+            lines.append(rng.choice(('sort', 'print', 'print in', 'print bfs', 'print pre', 'print post')))
+        elif choice < 0.87:
+            lines.append(rng.choice(('report sizes', 'report top 3', 'metrics')))
+        elif choice < 0.9:
+            lines.append(rng.choice(('bogus', 'add', f'add {name}', 'print sideways', f'create "{name} K" 1')))
+    lines += ['sort', 'print', 'print bfs', 'print pre', 'print post', 'owners limit=1000']
+    return lines
+
+
+def owner_blocks(text):
+    """
+    Split print output into one block per owner, in a canonical order.
+    """
+    return sorted(text.split('\nOwner: '))
+
+
+class ShardedOutputTest(unittest.TestCase):
+    """
+    Every batch command gives the same output on a sharded store as on one tree.
+    """
+
+    def run_both(self, shard_count, seed):
+        ex7.reset_owner_index()
+        shards = pokedex_shards.start_shards(shard_count)
+        try:
+            root = None
+            for line in make_script(seed):
+                # One line at a time, so each command's output can be compared on its own
+                expected = io.StringIO()
+                root = ex7.run_batch(root, [line], ex7.make_output_sink(expected))
+                actual = io.StringIO()
+                pokedex_shards.run_sharded_batch(shards, [line], ex7.make_output_sink(actual))
+                verb = line.split()[0]
+                if verb in UNSUPPORTED:
+                    self.assertEqual(actual.getvalue(), f"error: line 1: '{verb}' isn't supported with shards\n")
+                elif line in SHARD_BY_SHARD and shard_count > 1:
+                    self.assertEqual(owner_blocks(actual.getvalue()), owner_blocks(expected.getvalue()), line)
+                else:
+                    self.assertEqual(actual.getvalue(), expected.getvalue(), line)
+        finally:
+            pokedex_shards.stop_shards(shards)
+        self.assertTrue(all(process.exitcode == 0 for process in shards['processes']))
+
+    def test_one_shard(self):
+        self.run_both(1, seed=1)
+
+    def test_three_shards(self):
+        self.run_both(3, seed=2)
+
+    def test_whole_batch(self):
+        # Pipelined: the owner commands of a batch are all sent before their replies are read
+        lines = make_script(3)
+        lines = [line for line in lines if line not in SHARD_BY_SHARD and line.split()[0] not in UNSUPPORTED]
+        ex7.reset_owner_index()
+        # Started first, so the shards don't inherit this process's tree
+        shards = pokedex_shards.start_shards(3)
+        try:
+            expected = io.StringIO()
+            ex7.run_batch(None, lines, ex7.make_output_sink(expected))
+            actual = io.StringIO()
+            pokedex_shards.run_sharded_batch(shards, lines, ex7.make_output_sink(actual))
+        finally:
+            pokedex_shards.stop_shards(shards)
+        self.assertEqual(actual.getvalue(), expected.getvalue())
+
+    def test_sort_with_concurrent_writer(self):
+        # As in the server: other commands go to the shards while a sort is being merged
+        async def session(shards):
+            loop = asyncio.get_running_loop()
+            pokedex_shards.watch_shards(shards, loop)
+            null_sink = ex7.make_output_sink('null')
+            try:
+                for i in range(3000):
+                    await pokedex_shards.run_sharded_command(shards, ['create', f'o{i}', '1'], null_sink)
+
+                async def writer():
+                    for i in range(0, 3000, 3):
+                        await pokedex_shards.run_sharded_command(shards, ['add', f'o{i}', '4'], null_sink)
+
+                sorted_out = io.StringIO()
+                sink = ex7.make_output_sink(sorted_out)
+                await asyncio.gather(writer(), pokedex_shards.run_sharded_command(shards, ['sort'], sink),
+                                     pokedex_shards.run_sharded_command(shards, ['print'], sink))
+                ex7.flush_output_sink(sink)
+                return sorted_out.getvalue()
+            finally:
+                pokedex_shards.unwatch_shards(shards, loop)
+
+        ex7.reset_owner_index()
+        shards = pokedex_shards.start_shards(3)
+        try:
+            text = asyncio.run(session(shards))
+        finally:
+            pokedex_shards.stop_shards(shards)
+        sorted_names = [line.split()[1] for line in text.splitlines() if '(has' in line]
+        printed_names = [line.split()[1] for line in text.splitlines()
+                         if line.startswith('Owner: ') and '(has' not in line]
+        self.assertEqual(len(sorted_names), 3000)
+        self.assertEqual(len(set(sorted_names)), 3000)
+        self.assertEqual(sorted(printed_names), sorted(set(printed_names)))
+        self.assertEqual(len(printed_names), 3000)
+
+
+if __name__ == "__main__":
+    unittest.main()